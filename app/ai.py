@@ -1,10 +1,13 @@
+import numpy as np
+import re
+from collections import deque
+from time import monotonic
 from pydantic_ai import Agent
 from pydantic_ai.models.openai import OpenAIChatModel
 from pydantic_ai.providers.openrouter import OpenRouterProvider
 from dotenv import load_dotenv
 from os import getenv
 from app.models import AiResponse, LightActionArgs, Perc, TrackingModeArgs
-from openwakeword.model import Model as WakeModel
 from app.eventbus import EventBus
 
 load_dotenv()
@@ -16,44 +19,89 @@ class Ai():
             "@preset/the-lamp-ai",
             provider=OpenRouterProvider(api_key=getenv('OPENROUTER_API_KEY', "DUMMYKEY")),
         )
-        self.agent = Agent(self.model, output_type=AiResponse)
-        self.wake_model = WakeModel(wakeword_models=["hey_jarvis"])
+        self.agent = Agent(self.model, output_type=AiResponse,
+                           instructions="Always write the action first, then the emote, then the text.")
+        self.timings = deque(maxlen=64) # Per request, in seconds
 
         if bus:
             bus.subscribe("ai_request")(self.on_request)
-            bus.subscribe("audio_input")(self.wake_predict)
+
+    def dispatch(self, args: LightActionArgs | TrackingModeArgs) -> None:
+        ''' Execute an action '''
+        if not self.bus:
+            return
+        if isinstance(args, LightActionArgs):
+            self.bus.emit("light_set", Perc(val=args.perc))
+        elif isinstance(args, TrackingModeArgs):
+            self.bus.emit("tracking_mode", args.type, args.subjects)
+
+    def speak(self, text: str, spoken: int, final: bool) -> int:
+        ''' Send the complete sentences not spoken yet to "talk" (all the rest when final), return the spoken length '''
+        pending = text[spoken:]
+        end = len(pending)
+        if not final:
+            ends = [match.end() for match in re.finditer(r"[.!?…;:]\s+", pending)]
+            if not ends:
+                return spoken
+            end = ends[-1]
+
+        chunk = pending[:end].strip()
+        if chunk and self.bus:
+            self.bus.emit("talk", chunk)
+        return spoken + end
 
     async def on_request(self, request: str) -> AiResponse:
-        ''' Execute any request to AI '''
+        '''
+            Execute any request to AI, streamed: an action is executed as soon as it is complete
+            (a later action or field has started) and the text is spoken by sentences
+        '''
         print(f"Requested: {request}")
-        result = await self.agent.run(request)
-        response = result.output
-
-        # Execute all actions
-        if self.bus:
-            if response.action:
-                for _name, args in response.action.items():
-                    if isinstance(args, LightActionArgs):
-                        perc = Perc(val=args.perc)
-                        self.bus.emit("light_action", perc)
-                    elif isinstance(args, TrackingModeArgs):
-                        self.bus.emit("tracking_mode", args.type, args.subjects)
-            
-            self.bus.emit("talk", response.text)
+        start = monotonic()
+        first_token = first_action = None
+        dispatched = set()
+        spoken = 0
+
+        async with self.agent.run_stream(request) as result:
+            async for partial in result.stream_output(debounce_by=None):
+                if first_token is None:
+                    first_token = monotonic() - start
+
+                # The trailing action may still be incomplete
+                actions = list((partial.action or {}).items())
+                if not {"emote", "text"} & partial.model_fields_set:
+                    actions = actions[:-1]
+                for name, args in actions:
+                    if name not in dispatched:
+                        dispatched.add(name)
+                        self.dispatch(args)
+                        if first_action is None:
+                            first_action = monotonic() - start
 
+                if "text" in partial.model_fields_set:
+                    spoken = self.speak(partial.text, spoken, final=False)
+
+            response = await result.get_output()
+
+        for name, args in (response.action or {}).items():
+            if name not in dispatched:
+                self.dispatch(args)
+                if first_action is None:
+                    first_action = monotonic() - start
+        self.speak(response.text, spoken, final=True)
+
+        self.timings.append((first_token, first_action, monotonic() - start))
         return response
 
-    async def wake_predict(self, audio: bytes) -> bool:
-        ''' Detect if wake word is spoken '''
-        import numpy as np
-        # Assuming audio is PCM 16-bit mono, convert bytes to numpy array
-        audio_np = np.frombuffer(audio, dtype=np.int16)
-        prediction_dict, _ = self.wake_model.predict(audio_np)
-        for _, score in prediction_dict.items():
-            if score > 0.8:
-                print("Wake word detected")
-                if self.bus:
-                    self.bus.emit("ai_wakeup")
-                return True
-
-        return False
+    def stats(self) -> dict:
+        ''' Time to first token, first action and full response (ms) '''
+        def mean(values: list) -> float:
+            values = [value for value in values if value is not None]
+            return float(np.mean(values) * 1000) if values else 0.0
+
+        timings = list(self.timings)
+        return {
+            "requests": len(timings),
+            "ttft_ms": mean([timing[0] for timing in timings]),
+            "time_to_action_ms": mean([timing[1] for timing in timings]),
+            "total_ms": mean([timing[2] for timing in timings]),
+        }
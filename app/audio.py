@@ -1,33 +1,92 @@
-import io
+import asyncio
+import itertools
 import pyaudio
+import queue
+import struct
+import threading
 import numpy as np
-import wave
+from app.ringbuffer import PcmRing
+
+MAX_RECORD = 3600.0 # Seconds, the WAV sizes are 32-bit
 
 class Audio():
-    def __init__(self, bus=None, rate=16000, buffer_size=1024):
+    def __init__(self, bus=None, rate=16000, buffer_size=1024, history=10.0):
         ''' Audio (PCM) device '''
         self.audio = pyaudio.PyAudio()
         self.bus = bus
         self.rate = rate
         self.buffer_size = buffer_size
+        self.overflows = 0
+        self.sessions = itertools.count()
+
+        # Captured by the PortAudio callback thread, each consumer reads the ring at its own pace
+        self.ring = PcmRing(int(rate * history))
         self.in_stream = self.audio.open(format=pyaudio.paInt16,
                         channels=1,
                         rate=rate,
                         input=True,
-                        frames_per_buffer=buffer_size)
+                        frames_per_buffer=buffer_size,
+                        stream_callback=self.on_input)
         self.out_stream = self.audio.open(format=pyaudio.paInt16,
                         channels=1,
                         rate=rate,
                         output=True)
 
+        # Blocking writes are done by the player thread, by blocks so playback can be stopped
+        self.playback = queue.Queue()
+        self.generation = 0
+        self.player = threading.Thread(target=self.play_loop, name="player", daemon=True)
+        self.player.start()
+
+    def on_input(self, in_data, frame_count, time_info, status):
+        ''' Capture callback (PortAudio thread) '''
+        if status & pyaudio.paInputOverflow:
+            self.overflows += 1
+        self.ring.write(np.frombuffer(in_data, dtype=np.int16))
+        return (None, pyaudio.paContinue)
+
+    def play(self, samples: np.ndarray, started = None) -> None:
+        ''' Queue PCM samples for playback (non-blocking), started() is called when they start playing '''
+        self.playback.put((self.generation, samples, started))
+
+    def stop_playback(self) -> None:
+        ''' Stop the current playback and drop the queued one '''
+        self.generation += 1
+        try:
+            while True:
+                self.playback.get_nowait()
+        except queue.Empty:
+            pass
+
+    def play_loop(self) -> None:
+        ''' Player thread '''
+        while True:
+            item = self.playback.get()
+            if item is None:
+                break
+            generation, samples, started = item
+            if generation != self.generation:
+                continue
+            if started is not None:
+                started()
+            for i in range(0, len(samples), self.buffer_size):
+                if generation != self.generation:
+                    break
+                self.out_stream.write(samples[i:i + self.buffer_size].tobytes())
+
     async def update(self):
         ''' Audio buffer task '''
         if not self.bus:
             return
 
-        while self.in_stream.is_active():
-            data = self.in_stream.read(self.buffer_size)
-            await self.bus.emit("audio_input", data)
+        reader = self.ring.reader("audio_input")
+        try:
+            while self.in_stream.is_active():
+                samples = await asyncio.to_thread(reader.read, self.buffer_size, 1.0)
+                if samples is not None:
+                    self.bus.emit("audio_input", samples.tobytes())
+        finally:
+            reader.close()
 
     def tone(self, duration: float):
         ''' 
@@ -46,31 +105,53 @@ class Audio():
         audio = audio.astype(np.int16)
 
         # Play the tone
-        self.out_stream.write(audio.tobytes())
+        self.play(audio)
+
+    def wav_header(self, samples: int) -> bytes:
+        ''' WAV header of a known number of samples (PCM 16-bit, mono) '''
+        size = samples * 2
+        return struct.pack("<4sI4s4sIHHIIHH4sI", b"RIFF", 36 + size, b"WAVE", b"fmt ", 16, 1, 1,
+                           self.rate, self.rate * 2, 2, 16, b"data", size)
+
+    def record_samples(self, duration: float) -> int:
+        ''' Number of samples of a recording (the RIFF sizes must fit in 32 bits) '''
+        samples = int(self.rate * duration)
+        if not 0 < duration <= MAX_RECORD or 36 + samples * 2 > 0xFFFFFFFF:
+            raise ValueError(f"Invalid recording duration {duration} (0 to {MAX_RECORD} seconds)")
+        return samples
 
-    def record(self, duration: float):
+    def record_size(self, duration: float) -> int:
+        ''' Size in bytes of a WAV recording '''
+        return 44 + self.record_samples(duration) * 2
+
+    async def record(self, duration: float, chunk = 1024):
         ''' 
-            Record a audio sample in WAV format
+            Record a audio sample in WAV format, streamed as it is captured
             (used for testing the audio input)
         '''
-        # Record frame by 1024 bytes
-        frames = []
-        for _ in range(0, int(self.rate / 1024 * duration)):
-            data = self.in_stream.read(1024)
-            frames.append(data)
-
-        # Create a WAV file in memory from the RAW PCM Data
-        wav_buffer = io.BytesIO()
-        with wave.open(wav_buffer, 'wb') as wf:
-            wf.setnchannels(1)
-            wf.setsampwidth(2)
-            wf.setframerate(44100)
-            wf.writeframes(b''.join(frames))
-
-        return wav_buffer.getvalue()
+        samples = self.record_samples(duration)
+        reader = self.ring.reader(f"record-{next(self.sessions)}")
+        try:
+            yield self.wav_header(samples)
+            while samples > 0:
+                data = await asyncio.to_thread(reader.read, min(chunk, samples), 1.0)
+                if data is None:
+                    # Capture stopped: silence keeps the announced size
+                    data = np.zeros(min(chunk, samples), dtype=np.int16)
+                samples -= len(data)
+                yield data.tobytes()
+        finally:
+            reader.close()
+
+    def stats(self) -> dict:
+        ''' Capture overflows and ring readers '''
+        return {"overflows": self.overflows, **self.ring.stats()}
 
     def close(self):
         ''' Close all audio channel '''
+        self.stop_playback()
+        self.playback.put(None)
+        self.player.join(timeout=1)
         self.in_stream.stop_stream()
         self.out_stream.stop_stream()
         self.in_stream.close()
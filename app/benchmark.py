@@ -0,0 +1,132 @@
+'''
+    On-device benchmarks
+    python -m app.benchmark detectors clip.mp4 --backends haar,yunet
+    python -m app.benchmark models
+'''
+import argparse
+import cv2
+import numpy as np
+import timeit
+import tracemalloc
+from time import perf_counter
+from app.detector import DETECTORS, create_detector
+from app.models import Angle, Constraint, EncodedAngle, Normalized, Point, decode_enc
+from app.motor import Motor
+
+def load_clip(file: str, frames: int, downscale: int) -> list:
+    ''' Read (and downscale) the frames of a recorded clip '''
+    capture = cv2.VideoCapture(file)
+    if not capture.isOpened():
+        raise IOError(f"Cannot open clip {file}")
+
+    clip = []
+    while len(clip) < frames:
+        ret, frame = capture.read()
+        if not ret:
+            break
+        h, w = frame.shape[:2]
+        if downscale > 1:
+            frame = cv2.resize(frame, (w // downscale, h // downscale), interpolation=cv2.INTER_AREA)
+        clip.append(frame)
+
+    capture.release()
+    return clip
+
+def iou(a: tuple, b: tuple) -> float:
+    ''' Intersection over union of two boxes (x, y, w, h) '''
+    x1, y1 = max(a[0], b[0]), max(a[1], b[1])
+    x2, y2 = min(a[0] + a[2], b[0] + b[2]), min(a[1] + a[3], b[1] + b[3])
+    inter = max(0, x2 - x1) * max(0, y2 - y1)
+    union = a[2] * a[3] + b[2] * b[3] - inter
+    return inter / union if union > 0 else 0.0
+
+def agree(a: list, b: list, threshold = 0.5) -> bool:
+    ''' Two detections agree when both are empty or their first faces overlap '''
+    if len(a) == 0 or len(b) == 0:
+        return len(a) == len(b)
+    return iou(a[0], b[0]) >= threshold
+
+def run_detector(name: str, clip: list, min_size: int) -> tuple[np.ndarray, list]:
+    ''' Run a backend over the clip, return the per-frame latencies (s) and detections '''
+    detector = create_detector(name, min_size=min_size)
+    latencies = []
+    detections = []
+    for frame in clip:
+        start = perf_counter()
+        image = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if detector.grayscale else frame
+        faces = detector.detect(image)
+        latencies.append(perf_counter() - start)
+        detections.append(faces)
+    return np.array(latencies), detections
+
+def detectors(args) -> None:
+    ''' Compare the face detector backends on a clip (the first backend is the reference) '''
+    clip = load_clip(args.clip, args.frames, args.downscale)
+    if not clip:
+        raise IOError("Empty clip")
+    print(f"{len(clip)} frames of {clip[0].shape[1]}x{clip[0].shape[0]}")
+
+    reference = None
+    print(f"{'backend':<8} {'mean ms':>8} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8} {'fps':>7} {'found':>6} {'agree':>6}")
+    for name in args.backends.split(","):
+        try:
+            latencies, detections = run_detector(name, clip, max(1, args.min_size // args.downscale))
+        except IOError as e:
+            print(f"{name:<8} skipped: {e}")
+            continue
+        if reference is None:
+            reference = detections
+
+        ms = latencies * 1000
+        found = sum(1 for faces in detections if len(faces) > 0) / len(clip)
+        agreement = sum(1 for a, b in zip(reference, detections) if agree(a, b)) / len(clip)
+        print(f"{name:<8} {ms.mean():>8.1f} {np.percentile(ms, 50):>8.1f} {np.percentile(ms, 95):>8.1f} {ms.max():>8.1f} "
+              f"{len(clip) / latencies.sum():>7.1f} {found:>6.0%} {agreement:>6.0%}")
+
+def per_sample(make, number: int) -> tuple[float, float]:
+    ''' CPU time (µs) and memory kept (bytes) per call '''
+    seconds = min(timeit.repeat(make, number=number, repeat=5)) / number
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    kept = [make() for _ in range(1000)]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del kept
+    return seconds * 1e6, (after - before) / 1000
+
+def models(args) -> None:
+    ''' Compare the validated models with the hot path values '''
+    motor = Motor(None, 1, "bras1", Constraint(min=-180, max=180), Angle(deg=10)) # type: ignore
+    cases = [
+        ("tracked point", lambda: Normalized(x=0.25, y=-0.5), lambda: Point(0.25, -0.5)),
+        ("angle command", lambda: motor.encode_world_angle(Angle(deg=42.5)), lambda: motor.encode_world_deg(42.5)),
+        ("angle read", lambda: EncodedAngle(enc=1234).toAngle(), lambda: decode_enc(1234)),
+    ]
+
+    print(f"{'sample':<14} {'model us':>9} {'fast us':>9} {'speedup':>8} {'model B':>8} {'fast B':>8}")
+    for name, model, fast in cases:
+        model_us, model_bytes = per_sample(model, args.number)
+        fast_us, fast_bytes = per_sample(fast, args.number)
+        print(f"{name:<14} {model_us:>9.2f} {fast_us:>9.2f} {model_us / fast_us:>7.1f}x {model_bytes:>8.0f} {fast_bytes:>8.0f}")
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="LampeService benchmarks")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    command = commands.add_parser("detectors", help="face detector backends latency, throughput and agreement")
+    command.add_argument("clip", help="recorded video clip")
+    command.add_argument("--backends", default=",".join(DETECTORS), help="comma separated backends, the first is the reference")
+    command.add_argument("--frames", type=int, default=300, help="maximum number of frames")
+    command.add_argument("--downscale", type=int, default=2, help="same as Tracking.downscale")
+    command.add_argument("--min-size", type=int, default=200, help="minimum face size in full frame pixels")
+    command.set_defaults(run=detectors)
+
+    command = commands.add_parser("models", help="per-sample cost of the validated models and of the hot path values")
+    command.add_argument("--number", type=int, default=100000, help="calls per timing")
+    command.set_defaults(run=models)
+
+    args = parser.parse_args()
+    args.run(args)
+
+if __name__ == "__main__":
+    main()
@@ -1,28 +1,117 @@
 import cv2
 import asyncio
+import numpy as np
+import sys
+import threading
+from time import monotonic
+from typing import NamedTuple
+
+class Frame(NamedTuple):
+    ''' A captured frame (read-only view on the camera buffer) '''
+    image: np.ndarray
+    id: int
+    timestamp: float # monotonic(), in seconds
 
 class Camera():
     ''' Camera device '''
-    def __init__(self, bus=None, device = 0, fps = 5) -> None:
+    def __init__(self, bus=None, device = 0, fps = 5, buffers = 4) -> None:
         self.capture = cv2.VideoCapture(device)
         self.fps = fps
         self.bus = bus
         if not self.capture.isOpened():
             raise IOError("Cannot open camera")
 
-    async def snapshot(self) -> bytes:
-        frame = self.capture.read()
-        ret, jpeg = cv2.imencode('.jpg', frame[1])
+        # Ring of preallocated frames, written by the capture thread only.
+        # A slot is never written while a frame of it is still held by a consumer:
+        # the capture skips to a free slot, or allocates a new buffer when all are held.
+        self.buffers: list[np.ndarray] = []
+        self.size = buffers
+        self.allocations = 0
+        self.frame: Frame | None = None
+        self.frame_id = 0
+        self.new_frame = threading.Condition()
+        self.running = True
+        self.thread = threading.Thread(target=self.capture_loop, name="camera", daemon=True)
+        self.thread.start()
+
+    def capture_loop(self) -> None:
+        ''' Grab frames in the ring as fast as the sensor deliver them '''
+        slot = 0
+        while self.running and self.capture.isOpened():
+            buffer = None
+            if len(self.buffers) == self.size:
+                free = self.free_slot(slot)
+                if free is None:
+                    self.allocations += 1
+                else:
+                    slot = free
+                    buffer = self.buffers[slot]
+            ret, image = self.capture.read(buffer)
+            timestamp = monotonic()
+            if not ret:
+                print("Failed to grab frame")
+                self.running = False
+                break
+
+            # First lap (or resolution change): the ring is filled by the returned frames
+            if buffer is None or image is not buffer:
+                if len(self.buffers) < self.size:
+                    self.buffers.append(image)
+                else:
+                    self.buffers[slot] = image
+
+            view = image.view()
+            view.flags.writeable = False
+            with self.new_frame:
+                self.frame_id += 1
+                self.frame = Frame(view, self.frame_id, timestamp)
+                self.new_frame.notify_all()
+
+            slot = (slot + 1) % self.size
+            # Don't hold the slot we just published
+            del buffer, image, view
+
+    def leased(self, slot: int) -> bool:
+        ''' Whether a frame of the slot is still held (the views keep a reference to their buffer) '''
+        # References: the ring list and the getrefcount argument
+        return sys.getrefcount(self.buffers[slot]) > 2
+
+    def free_slot(self, start: int) -> int | None:
+        ''' First slot from "start" not held by a consumer '''
+        for i in range(self.size):
+            slot = (start + i) % self.size
+            if not self.leased(slot):
+                return slot
+        return None
+
+    def latest(self) -> Frame | None:
+        ''' Get the newest frame (by reference, no copy) '''
+        return self.frame
+
+    def wait(self, after: int, timeout: float | None = None) -> Frame | None:
+        ''' Wait for a frame newer than the id "after" (blocking) '''
+        with self.new_frame:
+            self.new_frame.wait_for(lambda: not self.running or (self.frame is not None and self.frame.id > after), timeout)
+        return self.frame
+
+    def snapshot(self) -> bytes:
+        frame = self.latest()
+        if frame is None:
+            raise IOError("No frame captured yet")
+        ret, jpeg = cv2.imencode('.jpg', frame.image)
         return jpeg.tobytes()
 
     async def read(self):
-        ''' Camera frame stream '''
-        while self.capture.isOpened():
-            ret, frame = self.capture.read()
-            if ret:
+        ''' Camera frame stream (newest frames, at most "fps" per second) '''
+        last_id = 0
+        while self.running:
+            frame = self.latest()
+            if frame is not None and frame.id > last_id:
+                last_id = frame.id
                 yield frame
-            else:
-                raise IOError("Failed to grab frame") 
+            await asyncio.sleep(1/self.fps)
+
+        raise IOError("Failed to grab frame")
 
     async def update(self) -> None:
         ''' Update the camera feed '''
@@ -31,8 +120,9 @@ class Camera():
 
         async for frame in self.read():
             self.bus.emit("camera_frame", frame)
-            await asyncio.sleep(1/self.fps)
 
     def close(self) -> None:
         ''' Close the camera feed '''
-        self.capture.release()
\ No newline at end of file
+        self.running = False
+        self.thread.join(timeout=1)
+        self.capture.release()
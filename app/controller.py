@@ -1,22 +1,50 @@
 import asyncio
-from app.world import inverse
-from app.models import Angle, Constraint, EncodedAngle, Normalized, Position
-from app.motor import Motor
-from typing import List
-from STservo_sdk import sts, PortHandler
+import numpy as np
+from concurrent.futures import Future
+from time import monotonic
+from typing import NamedTuple
+from app.models import Angle, Constraint, EncodedAngle, Position, TrackingTarget
+from app.motor import Motor, MotorExeption
+from app.scheduler import Priority, SerialScheduler
+from app.trajectory import Trajectory
+from app.servo import VisualServo
+from app.workspace import Workspace
+from app.world import JOINTS
+from STservo_sdk import sts, PortHandler, GroupSyncRead, COMM_SUCCESS
+from STservo_sdk import STS_PRESENT_POSITION_L, STS_PRESENT_SPEED_L, STS_PRESENT_LOAD_L, STS_PRESENT_VOLTAGE, STS_PRESENT_TEMPERATURE
 from app.eventbus import bus
 
 class ControllerExeption(BaseException):
     pass
 
+class MotorState(NamedTuple):
+    ''' Last known state of a motor '''
+    encoded: int
+    deg: float # World angle
+    speed: int # Steps per second
+    load: int # 0.1% of the max torque
+    voltage: float # Volts
+    temperature: int # °C
+    timestamp: float # monotonic(), in seconds
+
+    def age(self) -> float:
+        return monotonic() - self.timestamp
+
 class Controller():
-    ''' Motors controller (UART) device '''
+    '''
+        Motors controller (UART) device
+        (all the bus transactions are done by the serial scheduler thread)
+    '''
     handler: sts
     motors: dict[str, Motor]
 
-    def __init__(self, motor_device = "/dev/ttyS0", baudrate = 10000000, bus=None):
+    def __init__(self, motor_device = "/dev/ttyS0", baudrate = 10000000, bus=None, poll_rate = 2.0, control_rate = 50.0, servo_rate = 30.0):
         self.motors = {}
         self.bus = bus
+        self.poll_rate = poll_rate # Telemetry (controller_angles) in Hz
+        self.sync_read: GroupSyncRead | None = None
+        self.telemetry: dict[str, MotorState] = {}
+        self.workspace: asyncio.Task | None = None
 
         port = PortHandler(motor_device)
         port.setBaudRate(baudrate)
@@ -25,6 +53,11 @@ class Controller():
 
         self.handler = sts(port)
 
+        # UART transactions are blocking and must not interleave: one thread owns the port
+        self.scheduler = SerialScheduler()
+        self.trajectory = Trajectory(self, rate=control_rate)
+        self.servo = VisualServo(self, rate=servo_rate)
+
         if self.bus:
             self.bus.subscribe("controller_move_angles")(self.on_move_angles)
             self.bus.subscribe("controller_move_encodeds")(self.on_move_encodeds)
@@ -32,9 +65,11 @@ class Controller():
             self.bus.subscribe("controller_move_tracking")(self.on_move_tracking)
             self.bus.subscribe("controller_torque")(self.on_set_torque)
 
-    def add_motor(self, name: str, sts_id: int, offset: Angle, constraint: Constraint, is_reverse = False) -> Motor:
+    def add_motor(self, name: str, sts_id: int, offset: Angle, constraint: Constraint, is_reverse = False, speed = 300, acc = 20) -> Motor:
         ''' Add a motor on the controls system'''
-        self.motors[name] = Motor(self.handler, sts_id, name, constraint, offset, is_reverse)
+        self.motors[name] = Motor(self.handler, sts_id, name, constraint, offset, is_reverse, speed, acc)
+        self.sync_read = None
+        self.workspace = None
         return self.motors[name]
 
     def remove_motor(self, name: str):
@@ -43,7 +78,10 @@ class Controller():
         if motor == None:
             raise ControllerExeption(f'Motor {name} doesnt exist.')
 
-        del motor
+        del self.motors[name]
+        self.telemetry.pop(name, None)
+        self.sync_read = None
+        self.workspace = None
 
     def motor(self, name: str) -> Motor:
         ''' Get a motor from the controls system'''
@@ -52,14 +90,97 @@ class Controller():
             raise ControllerExeption(f'Motor {name} doesnt exist.')
         return motor
     
+    def joint_limits(self) -> np.ndarray:
+        ''' World limits (min, max) of the JOINTS (unbounded when not a motor) '''
+        limits = np.tile([-np.inf, np.inf], (len(JOINTS), 1))
+        for i, name in enumerate(JOINTS):
+            if name in self.motors:
+                limits[i] = self.motors[name].world_limits()
+        return limits
+
+    def build_workspace(self) -> asyncio.Task:
+        ''' Build (or load from the cache) the reachable workspace index of the current motors, in a thread '''
+        if self.workspace is None:
+            self.workspace = asyncio.get_running_loop().create_task(asyncio.to_thread(Workspace, self.joint_limits()))
+        return self.workspace
+
+    async def reachable(self) -> Workspace:
+        ''' Reachable workspace index of the current motors '''
+        return await self.build_workspace()
+
+    def read_encoded(self) -> np.ndarray:
+        '''
+            Read the present state of all motors in one SYNC_READ transaction (position to temperature block)
+            Columns: position, speed, load, voltage, temperature (position -1 when missing)
+        '''
+        if self.sync_read is None:
+            self.sync_read = GroupSyncRead(self.handler, STS_PRESENT_POSITION_L, STS_PRESENT_TEMPERATURE - STS_PRESENT_POSITION_L + 1)
+            for motor in self.motors.values():
+                self.sync_read.addParam(motor.id)
+
+        state = np.zeros((len(self.motors), 5), dtype=np.int32)
+        state[:, 0] = -1
+        if len(self.motors) == 0 or self.sync_read.txRxPacket() != COMM_SUCCESS:
+            return state
+
+        read = self.sync_read.getData
+        for i, motor in enumerate(self.motors.values()):
+            available, error = self.sync_read.isAvailable(motor.id, STS_PRESENT_POSITION_L, 2)
+            if available and error == 0:
+                state[i] = (
+                    read(motor.id, STS_PRESENT_POSITION_L, 2),
+                    self.handler.sts_tohost(read(motor.id, STS_PRESENT_SPEED_L, 2), 15),
+                    self.handler.sts_tohost(read(motor.id, STS_PRESENT_LOAD_L, 2), 10),
+                    read(motor.id, STS_PRESENT_VOLTAGE, 1),
+                    read(motor.id, STS_PRESENT_TEMPERATURE, 1),
+                )
+        return state
+
+    def world_angles(self, encoded: np.ndarray) -> np.ndarray:
+        ''' Convert the encoded positions of all motors to world angles (NaN when missing) '''
+        motors = self.motors.values()
+        signs = np.array([-1.0 if motor.is_reverse else 1.0 for motor in motors])
+        offsets = np.array([motor.offset.deg for motor in motors])
+        degrees = (encoded * (360 / 4096)) % 360
+        return np.where(encoded >= 0, degrees * signs - offsets, np.nan)
+
+    def read_world(self) -> dict[str, Angle]:
+        ''' Read the world angles of all motors and update the telemetry (missing motors are skipped) '''
+        state = self.read_encoded()
+        timestamp = monotonic()
+        angles = self.world_angles(state[:, 0])
+
+        result = {}
+        for name, deg, (encoded, speed, load, voltage, temperature) in zip(self.motors.keys(), angles.tolist(), state.tolist()):
+            if deg != deg:
+                continue
+            self.telemetry[name] = MotorState(encoded, deg, speed, load, voltage / 10, temperature, timestamp)
+            # Not validated: a reversed motor with an offset can be outside ±360°
+            result[name] = Angle.model_construct(deg=deg)
+        return result
+
+    async def state(self, name: str, max_age: float | None = None) -> MotorState:
+        '''
+            Last known state of a motor (without using the bus).
+            A fresh read is done only if there is none or if it is older than max_age seconds.
+        '''
+        self.motor(name)
+        state = self.telemetry.get(name)
+        if state is None or (max_age is not None and state.age() > max_age):
+            await self.scheduler.call(Priority.TELEMETRY, self.read_world)
+            state = self.telemetry.get(name)
+            if state is None:
+                raise ControllerExeption(f'Motor {name} doesnt answer.')
+        return state
+
     async def read(self):
-        ''' Stream motors world angles '''
+        ''' Stream motors world angles (at poll_rate) '''
+        loop = asyncio.get_running_loop()
+        deadline = loop.time()
         while self.handler.portHandler.is_open:
-            angles: dict[str, Angle] = {}
-            for name, motor in self.motors.items():
-                angles[name] = motor.get_world_angle()
-
-            yield angles
+            yield await self.scheduler.call(Priority.TELEMETRY, self.read_world)
+            deadline = max(deadline + 1/self.poll_rate, loop.time())
+            await asyncio.sleep(deadline - loop.time())
 
     async def update(self):
         ''' Update '''
@@ -68,20 +189,26 @@ class Controller():
 
         async for angles in self.read():
             self.bus.emit("controller_angles", angles)
-            await asyncio.sleep(0.5)
 
-    def unlock_all_motors(self) -> None:
-        ''' Unlock all motors '''
-        for name, motor in self.motors.items():
-            motor.set_torque(False)
+    def set_torque(self, enable: bool) -> None:
+        ''' Set the torque of all motors (in the serial thread) '''
+        for _, motor in self.motors.items():
+            motor.set_torque(enable)
 
-    def lock_all_motors(self) -> None:
+    def unlock_all_motors(self) -> Future:
         ''' Unlock all motors '''
-        for name, motor in self.motors.items():
-            motor.set_torque(True)
+        return self.scheduler.submit(Priority.EMERGENCY, self.set_torque, False)
+
+    def lock_all_motors(self) -> Future:
+        ''' Lock all motors '''
+        return self.scheduler.submit(Priority.EMERGENCY, self.set_torque, True)
 
-    def check_all_motors(self) -> dict[str, Motor]:
-        ''' Checkup all motors. '''
+    def check_all_motors(self) -> dict[str, bool]:
+        ''' Checkup all motors (blocking). '''
+        return self.scheduler.submit(Priority.TELEMETRY, self.check_motors).result()
+
+    def check_motors(self) -> dict[str, bool]:
+        ''' Checkup all motors (in the serial thread) '''
         checkup = {}
         for name, motor in self.motors.items():
             if not motor.check_motor():
@@ -94,40 +221,92 @@ class Controller():
     
     def close(self):
         ''' Close the motor system '''
+        self.trajectory.stop()
+        self.servo.stop()
         self.unlock_all_motors()
+        self.scheduler.close()
         self.handler.portHandler.closePort()
 
+    def stats(self) -> dict:
+        ''' Serial bus counters '''
+        return {**self.scheduler.stats(), "trajectory_overruns": self.trajectory.overruns, "servo": self.servo.stats()}
+
+    def write_goals(self, goals: dict[str, tuple[int, int, int]]) -> None:
+        '''
+            Send goals {name: (encoded, speed, acc)} in one coordinated motion (in the serial thread):
+            one SYNC_WRITE of all goals (acc, position, speed block) and one ACTION
+        '''
+        if not goals:
+            return
+
+        for name, (encoded, speed, acc) in goals.items():
+            self.handler.SyncWritePosEx(self.motors[name].id, encoded, speed, acc)
+        self.handler.groupSyncWrite.txPacket()
+        self.handler.groupSyncWrite.clearParam()
+        self.handler.RegAction()
+
+    def move_steps(self, steps: dict[str, int], speeds: dict[str, int] | None = None, accs: dict[str, int] | None = None) -> Future:
+        '''
+            Move a group of motors to encoded steps in one coordinated motion (Constraint not checked).
+            Goals still queued for the same motors are replaced.
+        '''
+        speeds = speeds or {}
+        accs = accs or {}
+        goals = {}
+        for name, encoded in steps.items():
+            motor = self.motor(name)
+            goals[name] = (encoded, speeds.get(name, motor.speed), accs.get(name, motor.acc))
+        return self.scheduler.submit_goals(goals, self.write_goals)
+
+    def move_degrees(self, degrees: dict[str, float], speeds: dict[str, int] | None = None, accs: dict[str, int] | None = None) -> Future:
+        ''' Move a group of motors to world angles (deg) in one coordinated motion, all constraints are checked first '''
+        steps = {name: self.motor(name).encode_world_deg(deg) for name, deg in degrees.items()}
+        return self.move_steps(steps, speeds, accs)
+
+    def move_encodeds(self, encodeds: dict[str, EncodedAngle], speeds: dict[str, int] | None = None, accs: dict[str, int] | None = None) -> Future:
+        ''' Move a group of motors in one coordinated motion (Constraint not checked) '''
+        return self.move_steps({name: encoded.enc for name, encoded in encodeds.items()}, speeds, accs)
+
+    def move_angles(self, angles: dict[str, Angle], speeds: dict[str, int] | None = None, accs: dict[str, int] | None = None) -> Future:
+        ''' Move a group of motors in one coordinated motion, all constraints are checked first '''
+        return self.move_degrees({name: angle.deg for name, angle in angles.items()}, speeds, accs)
+
     async def on_move_angles(self, angles: dict[str, Angle]) -> None:
-        ''' Move a group of motor using angles '''
-        for name, angle in angles.items():
-            try:
-                self.motor(name).set_world_angle(angle)
-                print(f"Moving {name} to angle {angle.deg}°.")
-            except:
-                pass
+        ''' Move a group of motor using angles (smooth trajectory) '''
+        self.servo.stop()
+        try:
+            self.trajectory.move_joints(angles)
+            print(f"Moving to angles {', '.join(f'{name} {angle.deg}°' for name, angle in angles.items())}.")
+        except (ControllerExeption, MotorExeption, ValueError) as e:
+            print(f"Move cancelled: {e}")
 
     async def on_move_encodeds(self, encodeds: dict[str, EncodedAngle]) -> None:
         ''' Move a group of motors using encoded angles (Constraint not checked)'''
-        for name, encoded in encodeds.items():
-            try:
-                self.motor(name).set_encoded_angle(encoded)
-                print(f"Moving {name} to encoded angle {encoded.enc}.")
-            except:
-                pass
+        try:
+            await asyncio.wrap_future(self.move_encodeds(encodeds))
+            print(f"Moving to encoded angles {', '.join(f'{name} {encoded.enc}' for name, encoded in encodeds.items())}.")
+        except ControllerExeption as e:
+            print(f"Move cancelled: {e}")
 
     async def on_move_position(self, position: Position) -> None:
-        ''' Move to a position using motors '''
-        print(f"Moving to position {position}")
-        angles = inverse(position)
-        await self.on_move_angles(angles)
+        ''' Move to a position using motors (straight line) '''
+        self.servo.stop()
+        try:
+            target = np.array([position.x, position.y, position.z])
+            workspace = await self.reachable()
+            if not workspace.contains(target):
+                x, y, z = workspace.nearest(target).tolist()
+                print(f"Position {position} unreachable, using the nearest reachable one")
+                position = Position(x=x, y=y, z=z)
+            print(f"Moving to position {position}")
+            self.trajectory.move_position(position)
+        except (ControllerExeption, ValueError) as e:
+            print(f"Move cancelled: {e}")
 
-    async def on_move_tracking(self, moving_norm: Normalized) -> None:
-        ''' Move motors for tracking '''
-        # It will be complex
-        print(f"Tracking: {moving_norm}")
-        return
+    async def on_move_tracking(self, moving_norm: TrackingTarget) -> None:
+        ''' Move motors for tracking (visual servoing loop) '''
+        self.servo.update(moving_norm)
 
     async def on_set_torque(self, enable: bool) -> None:
         ''' Set the torque for all motors '''
-        for _, motor in self.motors.items():
-            motor.set_torque(enable)
\ No newline at end of file
+        await asyncio.wrap_future(self.lock_all_motors() if enable else self.unlock_all_motors())
\ No newline at end of file
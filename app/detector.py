@@ -0,0 +1,99 @@
+import cv2
+import numpy as np
+from abc import ABC, abstractmethod
+from os import path
+
+class Detector(ABC):
+    ''' Face detector backend '''
+    grayscale = True # Input image: grayscale or BGR
+
+    def __init__(self, min_size = 100) -> None:
+        self.min_size = min_size
+
+    def detect(self, image, roi: tuple | None = None) -> list:
+        ''' Detect faces (x, y, w, h) in an image, or only in its region (x, y, w, h) '''
+        x0, y0 = 0, 0
+        if roi is not None:
+            x0, y0, rw, rh = roi
+            image = image[y0:y0+rh, x0:x0+rw]
+
+        return [(int(x) + x0, int(y) + y0, int(w), int(h)) for (x, y, w, h) in self.faces(image)]
+
+    @abstractmethod
+    def faces(self, image) -> list:
+        ''' Detect faces (x, y, w, h) in the whole image '''
+
+def require(file: str) -> str:
+    ''' Check that a model file exists '''
+    if not path.exists(file):
+        raise IOError(f"Missing detector model {file} (download it from the OpenCV model zoo)")
+    return file
+
+class HaarDetector(Detector):
+    ''' Haar cascade (OpenCV) '''
+    def __init__(self, min_size = 100, model = "app/data/haarcascade_frontalface_default.xml", scale_factor = 1.1, min_neighbors = 5) -> None:
+        super().__init__(min_size)
+        self.classifier = cv2.CascadeClassifier(require(model))
+        self.scale_factor = scale_factor
+        self.min_neighbors = min_neighbors
+
+    def faces(self, image) -> list:
+        return self.classifier.detectMultiScale(
+            image, scaleFactor=self.scale_factor, minNeighbors=self.min_neighbors,
+            minSize=(self.min_size, self.min_size), flags=cv2.CASCADE_SCALE_IMAGE)
+
+class YuNetDetector(Detector):
+    ''' YuNet CNN (OpenCV DNN, CPU) '''
+    grayscale = False
+
+    def __init__(self, min_size = 100, model = "app/data/face_detection_yunet_2023mar.onnx", score_threshold = 0.8, nms_threshold = 0.3) -> None:
+        super().__init__(min_size)
+        self.model = cv2.FaceDetectorYN.create(require(model), "", (320, 320), score_threshold, nms_threshold)
+
+    def faces(self, image) -> list:
+        h, w = image.shape[:2]
+        self.model.setInputSize((w, h))
+        _ret, faces = self.model.detect(image)
+        if faces is None:
+            return []
+        # Rows: x, y, w, h, 5 landmarks, score (sorted by the model)
+        return [face[:4] for face in faces if min(face[2], face[3]) >= self.min_size]
+
+class SsdDetector(Detector):
+    ''' ResNet-10 SSD (OpenCV DNN, CPU) '''
+    grayscale = False
+
+    def __init__(self, min_size = 100, model = "app/data/res10_300x300_ssd_iter_140000.caffemodel",
+                 config = "app/data/deploy.prototxt", score_threshold = 0.6) -> None:
+        super().__init__(min_size)
+        self.net = cv2.dnn.readNetFromCaffe(require(config), require(model))
+        self.net.setPreferableBackend(cv2.dnn.DNN_BACKEND_OPENCV)
+        self.net.setPreferableTarget(cv2.dnn.DNN_TARGET_CPU)
+        self.score_threshold = score_threshold
+
+    def faces(self, image) -> list:
+        h, w = image.shape[:2]
+        blob = cv2.dnn.blobFromImage(image, 1.0, (300, 300), (104.0, 177.0, 123.0))
+        self.net.setInput(blob)
+        detections = self.net.forward()[0, 0]
+        # Rows: _, _, score, x1, y1, x2, y2 (normalized), sorted by score
+        detections = detections[detections[:, 2] >= self.score_threshold]
+        boxes = np.clip(detections[:, 3:7], 0, 1) * np.array([w, h, w, h])
+        faces = []
+        for x1, y1, x2, y2 in boxes:
+            if min(x2 - x1, y2 - y1) >= self.min_size:
+                faces.append((x1, y1, x2 - x1, y2 - y1))
+        return faces
+
+DETECTORS: dict[str, type[Detector]] = {
+    "haar": HaarDetector,
+    "yunet": YuNetDetector,
+    "ssd": SsdDetector,
+}
+
+def create_detector(name: str, **options) -> Detector:
+    ''' Create a face detector backend by name '''
+    detector = DETECTORS.get(name)
+    if detector is None:
+        raise ValueError(f"Unknown detector {name} (available: {', '.join(DETECTORS)})")
+    return detector(**options)
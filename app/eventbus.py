@@ -1,28 +1,243 @@
 import asyncio
+import multiprocessing
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from enum import Enum
+from functools import partial
+
+class Policy(str, Enum):
+    ''' Behaviour of a topic queue when it is full '''
+    DROP_OLDEST = "drop_oldest"  # Discard the oldest pending event
+    LATEST = "latest"            # Only the newest event is kept (latest-wins)
+    BLOCK = "block"              # Wait for room (publish only)
+    REJECT = "reject"            # Refuse the new event
+
+class Offload(str, Enum):
+    ''' Where a listener is executed '''
+    LOOP = "loop"        # On the event loop (async or quick sync listeners)
+    THREAD = "thread"    # In the bus thread pool (blocking I/O)
+    PROCESS = "process"  # In the bus process pool (CPU-bound, picklable listener and args)
+
+class TopicStats():
+    ''' Counters of a topic '''
+    def __init__(self):
+        self.emitted = 0
+        self.delivered = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.rejected = 0
+        self.failed = 0
+
+class Subscription():
+    ''' A listener with its own bounded queue and worker '''
+    def __init__(self, listener, maxsize: int, offload: Offload | Executor):
+        self.listener = listener
+        self.offload = offload
+        self.queue = asyncio.Queue(maxsize=maxsize)
+        self.task = None
 
 class EventBus():
     ''' Event bus'''
-    def __init__(self):
+    def __init__(self, maxsize = 64, policy = Policy.DROP_OLDEST):
         self.listeners = {}
+        self.topics = {}
+        self.counters = {}
+        self.maxsize = maxsize
+        self.policy = policy
+        self.loop = None
+        self.executors = {}
+
+    def bind(self, loop: asyncio.AbstractEventLoop | None = None) -> None:
+        ''' Set the loop of the listeners (the running loop by default), the threads can emit from then on '''
+        self.loop = loop or asyncio.get_running_loop()
 
-    def subscribe(self, event_name: str) -> None:
-        ''' Subscribe for an event in the bus '''
+    def configure(self, event_name: str, maxsize: int | None = None, policy: Policy | None = None) -> None:
+        ''' Set the queue size and the policy of a topic (before subscribing) '''
+        self.topics[event_name] = (maxsize or self.maxsize, policy or self.policy)
+
+    def topic(self, event_name: str) -> tuple[int, Policy]:
+        ''' Get the queue size and the policy of a topic '''
+        return self.topics.get(event_name, (self.maxsize, self.policy))
+
+    def subscribe(self, event_name: str, offload: Offload | Executor = Offload.LOOP) -> None:
+        '''
+            Subscribe for an event in the bus
+            (blocking or CPU-bound listeners should be offloaded to a thread/process
+            or to a dedicated executor)
+        '''
         def upper(func):
-            self.listeners[event_name] = self.listeners.get(event_name, set())
-            self.listeners[event_name].add(func)
+            maxsize, policy = self.topic(event_name)
+            if policy == Policy.LATEST:
+                maxsize = 1
+
+            self.listeners[event_name] = self.listeners.get(event_name, {})
+            self.listeners[event_name][func] = Subscription(func, maxsize, offload)
             return func
         return upper # type: ignore
 
     def unsubscribe(self, event_name: str, listener) -> None:
         ''' Unsubscribe for an event in the bus '''
-        self.listeners[event_name].remove(listener)
+        subscription = self.listeners[event_name].pop(listener)
+        if subscription.task:
+            subscription.task.cancel()
         if len(self.listeners[event_name]) == 0:
             del self.listeners[event_name]
 
-    def emit(self, event_name: str, *args, **kwargs) -> None:
-        ''' Emit an event in the bus '''
-        listeners = self.listeners.get(event_name, [])
-        for listener in listeners:
-            asyncio.create_task(listener(*args, **kwargs))
+    def emit(self, event_name: str, *args, **kwargs) -> bool:
+        ''' Emit an event in the bus (never wait, return False if a listener refused it) '''
+        return self.enqueue(event_name, args, kwargs, None)
+
+    def enqueue(self, event_name: str, args: tuple, kwargs: dict, futures: list | None) -> bool:
+        ''' Put an event in the queue of all listeners (thread-safe) '''
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            # Emitted from an offloaded listener or a device thread (dropped until the bus is bound)
+            if self.loop is None:
+                return False
+            self.loop.call_soon_threadsafe(self.enqueue, event_name, args, kwargs, futures)
+            return True
+
+        _maxsize, policy = self.topic(event_name)
+        stats = self.stats_of(event_name)
+        stats.emitted += 1
+
+        accepted = True
+        for subscription in self.listeners.get(event_name, {}).values():
+            self.start(subscription, event_name)
+            queue = subscription.queue
+            future = self.future(futures)
+            if policy == Policy.LATEST:
+                while not queue.empty():
+                    self.cancel(queue.get_nowait())
+                    stats.coalesced += 1
+            elif queue.full():
+                if policy == Policy.DROP_OLDEST:
+                    self.cancel(queue.get_nowait())
+                    stats.dropped += 1
+                else:
+                    # Can't wait here, BLOCK topics must use publish
+                    stats.rejected += 1
+                    accepted = False
+                    if future:
+                        future.cancel()
+                    continue
+
+            queue.put_nowait((args, kwargs, future))
+
+        return accepted
+
+    async def publish(self, event_name: str, *args, **kwargs) -> bool:
+        ''' Emit an event in the bus, waiting for room on BLOCK topics '''
+        return await self.put(event_name, args, kwargs, None)
+
+    async def request(self, event_name: str, *args, **kwargs) -> list:
+        '''
+            Emit an event in the bus and wait for the result of every listener
+            (an exception is returned in place of the result of a failed listener,
+            a dropped event gives a CancelledError)
+        '''
+        futures = []
+        await self.put(event_name, args, kwargs, futures)
+        return await asyncio.gather(*futures, return_exceptions=True)
+
+    async def put(self, event_name: str, args: tuple, kwargs: dict, futures: list | None) -> bool:
+        ''' Put an event in the queue of all listeners, waiting for room on BLOCK topics '''
+        _maxsize, policy = self.topic(event_name)
+        if policy != Policy.BLOCK:
+            return self.enqueue(event_name, args, kwargs, futures)
+
+        self.stats_of(event_name).emitted += 1
+        for subscription in list(self.listeners.get(event_name, {}).values()):
+            self.start(subscription, event_name)
+            await subscription.queue.put((args, kwargs, self.future(futures)))
+
+        return True
+
+    def future(self, futures: list | None) -> asyncio.Future | None:
+        ''' Create the result future of a listener (only when requested) '''
+        if futures is None:
+            return None
+        future = asyncio.get_running_loop().create_future()
+        futures.append(future)
+        return future
+
+    def cancel(self, item: tuple) -> None:
+        ''' Cancel the result future of a discarded event '''
+        future = item[2]
+        if future:
+            future.cancel()
+
+    def executor(self, offload: Offload | Executor) -> Executor | None:
+        ''' Get the executor of a listener (created on first use) '''
+        if isinstance(offload, Executor):
+            return offload
+        if offload == Offload.LOOP:
+            return None
+        if offload not in self.executors:
+            if offload == Offload.THREAD:
+                self.executors[offload] = ThreadPoolExecutor(thread_name_prefix="bus")
+            else:
+                # Spawned workers: forking the service would copy its threads and open devices
+                self.executors[offload] = ProcessPoolExecutor(mp_context=multiprocessing.get_context("spawn"))
+        return self.executors[offload]
+
+    def start(self, subscription: Subscription, event_name: str) -> None:
+        ''' Start the worker of a subscription (lazy, need a running loop) '''
+        if subscription.task is None or subscription.task.done():
+            self.loop = asyncio.get_running_loop()
+            subscription.task = self.loop.create_task(self.worker(subscription, event_name))
+
+    async def worker(self, subscription: Subscription, event_name: str) -> None:
+        ''' Deliver the events of a subscription, one at a time '''
+        stats = self.stats_of(event_name)
+        executor = self.executor(subscription.offload)
+        loop = asyncio.get_running_loop()
+        while True:
+            args, kwargs, future = await subscription.queue.get()
+            try:
+                if executor is None:
+                    result = subscription.listener(*args, **kwargs)
+                else:
+                    result = await loop.run_in_executor(executor, partial(subscription.listener, *args, **kwargs))
+                if asyncio.iscoroutine(result):
+                    result = await result
+                stats.delivered += 1
+                if future and not future.done():
+                    future.set_result(result)
+            except asyncio.CancelledError:
+                raise
+            except BaseException as e:
+                # The devices errors derive from BaseException
+                stats.failed += 1
+                print(f"Listener {getattr(subscription.listener, '__qualname__', subscription.listener)} failed on {event_name}: {e!r}")
+                if future and not future.done():
+                    future.set_exception(e)
+
+    def stats_of(self, event_name: str) -> TopicStats:
+        ''' Get the counters of a topic '''
+        if event_name not in self.counters:
+            self.counters[event_name] = TopicStats()
+        return self.counters[event_name]
+
+    def stats(self) -> dict[str, dict]:
+        ''' Get the counters and the queue depth of all topics '''
+        result = {}
+        for event_name, stats in self.counters.items():
+            subscriptions = self.listeners.get(event_name, {}).values()
+            result[event_name] = {
+                **vars(stats),
+                "policy": self.topic(event_name)[1].value,
+                "depth": sum(s.queue.qsize() for s in subscriptions),
+            }
+        return result
+
+    def close(self) -> None:
+        ''' Stop all workers and executors '''
+        for subscriptions in self.listeners.values():
+            for subscription in subscriptions.values():
+                if subscription.task:
+                    subscription.task.cancel()
+        for executor in self.executors.values():
+            executor.shutdown(wait=False, cancel_futures=True)
 
-bus = EventBus()
\ No newline at end of file
+bus = EventBus()
@@ -0,0 +1,53 @@
+import numpy as np
+
+class KalmanTarget():
+    ''' Constant-velocity Kalman filter of a 2D point (state: x, y, vx, vy) '''
+    def __init__(self, process_noise = 2.0, measurement_noise = 0.002) -> None:
+        self.q = process_noise # Acceleration variance (units/s^2)^2
+        self.r = measurement_noise # Measurement variance (units^2)
+        self.x = np.zeros(4)
+        self.p = np.eye(4)
+        self.h = np.array([[1.0, 0, 0, 0], [0, 1.0, 0, 0]])
+        self.timestamp: float | None = None
+
+    def reset(self) -> None:
+        ''' Forget the target '''
+        self.timestamp = None
+
+    def predict(self, timestamp: float) -> None:
+        ''' Move the state to a time (seconds) '''
+        dt = max(0.0, timestamp - self.timestamp) # type: ignore
+        f = np.eye(4)
+        f[0, 2] = f[1, 3] = dt
+        # White noise acceleration
+        q = np.array([[dt**4 / 4, dt**3 / 2], [dt**3 / 2, dt**2]]) * self.q
+        qf = np.zeros((4, 4))
+        qf[np.ix_([0, 2], [0, 2])] = q
+        qf[np.ix_([1, 3], [1, 3])] = q
+
+        self.x = f @ self.x
+        self.p = f @ self.p @ f.T + qf
+        self.timestamp = timestamp
+
+    def update(self, timestamp: float, x: float, y: float) -> None:
+        ''' Add a measurement taken at a time (seconds) '''
+        if self.timestamp is None:
+            self.x = np.array([x, y, 0.0, 0.0])
+            self.p = np.diag([self.r, self.r, 1.0, 1.0])
+            self.timestamp = timestamp
+            return
+
+        self.predict(timestamp)
+        innovation = np.array([x, y]) - self.h @ self.x
+        s = self.h @ self.p @ self.h.T + np.eye(2) * self.r
+        k = self.p @ self.h.T @ np.linalg.inv(s)
+        self.x = self.x + k @ innovation
+        self.p = (np.eye(4) - k @ self.h) @ self.p
+
+    def position(self, horizon = 0.0) -> tuple[float, float]:
+        ''' Position extrapolated "horizon" seconds after the last update '''
+        return (float(self.x[0] + self.x[2] * horizon), float(self.x[1] + self.x[3] * horizon))
+
+    def velocity(self) -> tuple[float, float]:
+        ''' Estimated velocity (units per second) '''
+        return (float(self.x[2]), float(self.x[3]))
@@ -1,5 +1,6 @@
 from rpi_hardware_pwm import HardwarePWM
 from app.models import Perc
+from app.eventbus import Offload
 
 class Light():
     def __init__(self, bus=None, min=0, max=100):
@@ -10,7 +11,7 @@ class Light():
         self.bus = bus
 
         if self.bus:
-            self.bus.subscribe("light_set")(self.set_light)
+            self.bus.subscribe("light_set", offload=Offload.THREAD)(self.set_light)
 
     def set_light(self, light: Perc):
         ''' Set the light '''
@@ -1,25 +1,48 @@
 import asyncio
 
-from app.audio import Audio
+from app.audio import MAX_RECORD, Audio
 from app.camera import Camera
 from app.controller import Controller
 from app.light import Light
+from app.speech import Speech
+from app.stream import Stream
 from app.tracking import Tracking
-from app.eventbus import bus
+from app.vad import VoiceGate
+from app.wakeword import WakeWord
+from app.eventbus import Policy, bus
 from app.models import Angle, EncodedAngle, Perc, Position
 
 from typing import Annotated
 from fastapi import FastAPI, Form, Response
+from fastapi.responses import StreamingResponse
 from fastapi.encoders import jsonable_encoder
 
+# Sensors topics keep only fresh data, commands must not be lost
+bus.configure("camera_frame", policy=Policy.LATEST)
+bus.configure("audio_input", maxsize=32, policy=Policy.DROP_OLDEST)
+bus.configure("controller_angles", policy=Policy.LATEST)
+bus.configure("controller_move_tracking", policy=Policy.LATEST)
+bus.configure("controller_move_angles", maxsize=16, policy=Policy.BLOCK)
+bus.configure("controller_move_encodeds", maxsize=16, policy=Policy.BLOCK)
+bus.configure("controller_move_position", maxsize=16, policy=Policy.BLOCK)
+bus.configure("controller_torque", maxsize=16, policy=Policy.BLOCK)
+
 _tracking = Tracking(bus=bus)
 camera = Camera(bus=bus, fps=5)
+stream = Stream(camera, fps=10, quality=70, width=640, max_age=0.5)
 light = Light(bus=bus, min=20, max=100)
 controller = Controller(motor_device="/dev/ttys006", baudrate=9600, bus=bus)
 audio = Audio(bus=bus)
+wakeword = WakeWord(audio, bus=bus, gate=VoiceGate(rate=audio.rate))
+speech = Speech(audio, bus=bus)
 
 async def start_sensors():
+    # The devices threads emit on this loop
+    bus.bind()
+    # Reachable workspace of the motors, ready before the first position move
+    controller.build_workspace()
     asyncio.create_task(camera.update())
+    asyncio.create_task(stream.update())
     asyncio.create_task(controller.update())
     asyncio.create_task(audio.update())
 
@@ -32,37 +55,55 @@ async def health():
 
 @app.get("/lock")
 async def lock_motors():
-    bus.emit("controller_torque", True)
+    await bus.publish("controller_torque", True)
     return None
 
 @app.get("/unlock")
 async def unlock_motors():
-    bus.emit("controller_torque", False)
+    await bus.publish("controller_torque", False)
     return None
 
 @app.get("/angle/{name}")
-async def get_angle(name: str):
-    return jsonable_encoder(controller.motor(name).get_world_angle())
+async def get_angle(name: str, max_age: float | None = None):
+    state = await controller.state(name, max_age)
+    return jsonable_encoder({**Angle.model_construct(deg=state.deg).model_dump(), "age": state.age()})
 
 @app.post("/angle/{name}")
 async def set_angle(name: str, angle: Annotated[Angle, Form()]):
-    bus.emit("controller_move_angles", {name: angle})
+    await bus.publish("controller_move_angles", {name: angle})
     return None
 
 @app.get("/encoder/{name}")
-async def get_encode(name: str):
-    return jsonable_encoder(controller.motor(name).get_encoded_angle())
+async def get_encode(name: str, max_age: float | None = None):
+    state = await controller.state(name, max_age)
+    return jsonable_encoder({**EncodedAngle(enc=state.encoded).model_dump(), "age": state.age()})
+
+@app.get("/telemetry/{name}")
+async def get_telemetry(name: str, max_age: float | None = None):
+    state = await controller.state(name, max_age)
+    return jsonable_encoder({**state._asdict(), "age": state.age()})
 
 @app.post("/encoder/{name}")
 async def set_encode(name: str, angle: Annotated[EncodedAngle, Form()]):
-    bus.emit("controller_move_encodeds", {name: angle})
+    await bus.publish("controller_move_encodeds", {name: angle})
     return None
 
 @app.post("/position")
 async def set_position(position: Annotated[Position, Form()]):
-    bus.emit("controller_move_position", position)
+    await bus.publish("controller_move_position", position)
     return None
 
+@app.get("/stats")
+async def stats():
+    return jsonable_encoder({
+        "bus": bus.stats(),
+        "stream": stream.stats(),
+        "serial": controller.stats(),
+        "audio": audio.stats(),
+        "wakeword": wakeword.stats(),
+        "speech": speech.stats(),
+    })
+
 # Light control
 @app.get("/light")
 async def get_light():
@@ -79,9 +120,14 @@ async def tone(duration: Annotated[float, Form()]):
     return audio.tone(duration)
 
 @app.post("/record")
-async def record(duration: Annotated[float, Form()]):
-    return Response(content=audio.record(duration), media_type="audio/wav")
+async def record(duration: Annotated[float, Form(gt=0, le=MAX_RECORD)]):
+    return StreamingResponse(audio.record(duration), media_type="audio/wav",
+                             headers={"Content-Length": str(audio.record_size(duration))})
 
 @app.get("/snapshot")
 async def snapshot():
-    return Response(content=camera.snapshot(), media_type="image/jpeg")
\ No newline at end of file
+    return Response(content=await stream.snapshot(), media_type="image/jpeg")
+
+@app.get("/stream")
+async def live_stream():
+    return StreamingResponse(stream.frames(), media_type=f"multipart/x-mixed-replace; boundary={stream.boundary}")
\ No newline at end of file
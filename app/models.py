@@ -1,12 +1,41 @@
 from enum import Enum
 import yaml
 
-from typing import Annotated, Any, Dict, List, Optional, Union
+from typing import Annotated, Any, Dict, List, NamedTuple, Optional, Union
 from pydantic import Field, BaseModel
 
+# Hot path values (per frame, per control period) are plain tuples and floats,
+# the validated models are for the API and the AI boundaries.
+
+def encode_deg(deg: float) -> int:
+    ''' Angle (deg) to encoded steps '''
+    return round(deg * (4096 / 360)) % 4096
+
+def decode_enc(enc: int) -> float:
+    ''' Encoded steps to angle (deg, [0, 360[) '''
+    return (enc * (360 / 4096)) % 360
+
+class Point(NamedTuple):
+    ''' Normalized image point '''
+    x: float
+    y: float
+
+    def toNormalized(self) -> "Normalized":
+        return Normalized.model_construct(x=self.x, y=self.y)
+
 class Normalized(BaseModel):
     x: Annotated[float, Field(default=0, ge=-1, le=1)]
     y: Annotated[float, Field(default=0, ge=-1, le=1)]
+    def toPoint(self) -> Point:
+        return Point(self.x, self.y)
+
+# Predicted tracking target (velocity in normalized units per second)
+class TrackingTarget(NamedTuple):
+    position: Point
+    vx: float
+    vy: float
+    timestamp: float # Capture time (monotonic, in seconds)
+    horizon: float # Prediction horizon from the capture (in seconds)
 
 class Perc(BaseModel):
      val: Annotated[int, Field(default=0, ge=0, le=100)]
@@ -20,16 +49,12 @@ class Position(BaseModel):
 class Angle(BaseModel):
     deg: Annotated[float, Field(default=0, ge=-360.0, le=360.0)]
     def toEncodedAngle(self):
-        return EncodedAngle(
-            enc=(round(self.deg * (4096 / 360)) % 4096),
-        )
+        return EncodedAngle.model_construct(enc=encode_deg(self.deg))
 
 class EncodedAngle(BaseModel):
     enc: Annotated[int, Field(default=2048, ge=0, le=4096)]
     def toAngle(self):
-        return Angle(
-            deg=(self.enc * (360 / 4096)) % 360,
-        )
+        return Angle.model_construct(deg=decode_enc(self.enc))
 
 class Constraint(BaseModel):
     min: Annotated[float, Field(default=0, ge=-360.0, le=360.0)]
@@ -91,7 +116,8 @@ class TrackingModeArgs(BaseModel):
     type: TrackingModeEnum
     subjects: Optional[TrackingSubjects] = None
 
+# Streamed: the actions come first so they can be executed before the text is generated
 class AiResponse(BaseModel):
-    text: Annotated[str, Field(default="...")]
+    action: Optional[Dict[str, Union[LightActionArgs, TrackingModeArgs]]] = None
     emote: Annotated[Emote, Field(default=Emote.IDLE)]
-    action: Optional[Dict[str, Union[LightActionArgs, TrackingModeArgs]]] = None
\ No newline at end of file
+    text: Annotated[str, Field(default="...")]
\ No newline at end of file
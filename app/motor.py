@@ -1,7 +1,7 @@
 from STservo_sdk import sts, COMM_SUCCESS, STS_TORQUE_ENABLE
-from app.models import Angle, Constraint, EncodedAngle
+from app.models import Angle, Constraint, EncodedAngle, decode_enc, encode_deg
 
-class MotorExeption():
+class MotorExeption(Exception):
     pass
 
 class Motor:
@@ -11,14 +11,18 @@ class Motor:
     offset: Angle
     handler: sts
     is_reverse: bool
+    speed: int
+    acc: int
 
-    def __init__(self, handler: sts, sts_id: int, name: str, constraint: Constraint, offset: Angle, is_reverse=False):
+    def __init__(self, handler: sts, sts_id: int, name: str, constraint: Constraint, offset: Angle, is_reverse=False, speed=300, acc=20):
         self.handler = handler
         self.id = sts_id
         self.name = name
         self.constraint = constraint
         self.offset = offset
         self.is_reverse = is_reverse
+        self.speed = speed
+        self.acc = acc
 
     def set_constraint(self, constraint: Constraint) -> None:
         ''' Change the motor constraint '''
@@ -28,6 +32,11 @@ class Motor:
         ''' Change the motor offset '''
         self.offset = offset
 
+    def set_speed(self, speed: int, acc: int) -> None:
+        ''' Change the motor moving speed and acceleration '''
+        self.speed = speed
+        self.acc = acc
+
     def check_motor(self) -> bool:
         ''' Check if the motor is available in the bus and in the good mode'''
         _model, result, error = self.handler.ping(self.id)
@@ -50,31 +59,40 @@ class Motor:
     def set_encoded_angle(self, angle: EncodedAngle) -> None:
         ''' Set absolute (encoded) angle to the motor (Constraint not checked) '''
 
-        self.handler.RegWritePosEx(self.id, angle.enc, 300, 20)
+        self.handler.RegWritePosEx(self.id, angle.enc, self.speed, self.acc)
         self.handler.RegAction()
 
     def get_world_angle(self) -> Angle:
         ''' Get the absolute world (with offset) angle.'''
-        angle = self.get_encoded_angle().toAngle()
+        deg = decode_enc(self.get_encoded_angle().enc)
 
         if self.is_reverse:
-            angle.deg *= -1
+            deg *= -1
 
-        angle.deg -= self.offset.deg
+        return Angle.model_construct(deg=deg - self.offset.deg)
 
-        return angle
+    def encode_world_deg(self, world: float) -> int:
+        ''' Convert a world (with offset) angle in degrees to encoded steps, checking the constraint '''
+        deg = -world if self.is_reverse else world
+        deg += self.offset.deg
 
-    def set_world_angle(self, angle: Angle) -> None:
-        ''' Set the absolute world (with offset) angle'''
-        if self.is_reverse:
-            angle.deg *= -1
+        if deg < self.constraint.max and deg > self.constraint.min:
+            return encode_deg(deg)
+        raise MotorExeption(f"Motor {self.name} cancel world angle command {deg}° : Constraint")
 
-        angle.deg += self.offset.deg
+    def encode_world_angle(self, angle: Angle) -> EncodedAngle:
+        ''' Convert a world (with offset) angle to the encoded angle, checking the constraint '''
+        return EncodedAngle.model_construct(enc=self.encode_world_deg(angle.deg))
 
-        if angle.deg < self.constraint.max and angle.deg > self.constraint.min:
-            self.set_encoded_angle(angle.toEncodedAngle())
-        else:
-            raise MotorExeption(f"Motor {self.name} cancel world angle command {angle.deg}° : Constraint")
+    def world_limits(self) -> tuple[float, float]:
+        ''' Constraint in world angles (as checked by encode_world_angle, bounds excluded) '''
+        low = self.constraint.min - self.offset.deg
+        high = self.constraint.max - self.offset.deg
+        return (-high, -low) if self.is_reverse else (low, high)
+
+    def set_world_angle(self, angle: Angle) -> None:
+        ''' Set the absolute world (with offset) angle'''
+        self.set_encoded_angle(self.encode_world_angle(angle))
 
     def set_torque(self, enable: bool) -> None:
         ''' Set the torque (lock/unlock motor)  '''
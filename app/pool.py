@@ -0,0 +1,120 @@
+import multiprocessing
+import numpy as np
+import queue
+from multiprocessing import shared_memory
+from app.detector import create_detector
+
+def detection_worker(name: str, shape: tuple, slots: int, jobs, results, detector: str, options: dict) -> None:
+    ''' Worker process: detect faces on the frames of the shared pool '''
+    memory = shared_memory.SharedMemory(name=name)
+    frames = np.ndarray((slots, *shape), dtype=np.uint8, buffer=memory.buf)
+    backend = create_detector(detector, **options)
+    try:
+        while (job := jobs.get()) is not None:
+            slot, frame_id, roi = job
+            faces = backend.detect(frames[slot], roi)
+            results.put((slot, frame_id, faces))
+    finally:
+        del frames
+        memory.close()
+
+class DetectionPool():
+    ''' Face detection in worker processes, the frames are shared in memory (never pickled) '''
+    def __init__(self, shape: tuple, workers = 3, slots: int | None = None, detector = "haar", options: dict | None = None) -> None:
+        self.shape = shape
+        self.slots = slots or workers * 2
+        self.memory = shared_memory.SharedMemory(create=True, size=self.slots * int(np.prod(shape)))
+        self.frames = np.ndarray((self.slots, *shape), dtype=np.uint8, buffer=self.memory.buf)
+        self.free = list(range(self.slots))
+        self.pending: dict[int, int] = {} # slot -> frame id
+        self.newest = 0 # Newest frame id given to the tracking
+        self.submitted = 0
+        self.skipped = 0
+        self.discarded = 0
+
+        # Spawn (not fork): the parent has camera/bus threads
+        context = multiprocessing.get_context("spawn")
+        self.jobs = context.Queue()
+        self.results = context.Queue()
+        self.processes = [
+            context.Process(
+                target=detection_worker,
+                args=(self.memory.name, shape, self.slots, self.jobs, self.results, detector, options or {}),
+                name=f"detection-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        for process in self.processes:
+            process.start()
+
+    def submit(self, image, frame_id: int, roi: tuple | None = None) -> bool:
+        ''' Copy a frame in a free slot and queue its detection '''
+        if not self.free or image.shape != self.shape:
+            self.skipped += 1
+            return False
+
+        slot = self.free.pop()
+        self.frames[slot][:] = image
+        self.pending[slot] = frame_id
+        self.jobs.put((slot, frame_id, roi))
+        self.submitted += 1
+        return True
+
+    def poll(self) -> tuple | None:
+        '''
+            Get the newest finished detection (slot, frame id, faces), None if there is none.
+            Older or out of order results are discarded. The slot must be released by the caller.
+        '''
+        newest = None
+        while True:
+            try:
+                result = self.results.get_nowait()
+            except queue.Empty:
+                break
+
+            slot, frame_id, _faces = result
+            if frame_id <= self.newest:
+                self.discarded += 1
+                self.release(slot)
+                continue
+            if newest is not None:
+                self.discarded += 1
+                self.release(newest[0])
+            self.newest = frame_id
+            newest = result
+
+        return newest
+
+    def frame(self, slot: int):
+        ''' Get the frame of a slot (valid until released) '''
+        return self.frames[slot]
+
+    def release(self, slot: int) -> None:
+        ''' Give back a slot to the pool '''
+        if self.pending.pop(slot, None) is not None:
+            self.free.append(slot)
+
+    def busy(self) -> int:
+        ''' Number of detections in progress (or not released) '''
+        return len(self.pending)
+
+    def stats(self) -> dict:
+        ''' Pool counters '''
+        return {
+            "workers": len(self.processes),
+            "busy": self.busy(),
+            "submitted": self.submitted,
+            "skipped": self.skipped,
+            "discarded": self.discarded,
+        }
+
+    def close(self) -> None:
+        ''' Stop the workers and free the shared memory '''
+        for _ in self.processes:
+            self.jobs.put(None)
+        for process in self.processes:
+            process.join(timeout=1)
+            if process.is_alive():
+                process.terminate()
+        del self.frames
+        self.memory.close()
+        self.memory.unlink()
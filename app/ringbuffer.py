@@ -0,0 +1,88 @@
+import numpy as np
+import threading
+
+class PcmRing():
+    '''
+        Single writer PCM ring (int16, mono), read by any number of independent readers.
+        The writer never waits: positions are absolute sample counts, a reader left more than
+        the capacity behind skips ahead and counts the samples it lost.
+    '''
+    def __init__(self, capacity: int) -> None:
+        self.capacity = capacity
+        self.buffer = np.zeros(capacity, dtype=np.int16)
+        self.written = 0 # Samples written since the start (published after the copy)
+        self.readers: dict[str, "PcmReader"] = {}
+        self.available = threading.Condition()
+
+    def write(self, samples: np.ndarray) -> None:
+        ''' Append samples (from the capture callback, never blocks) '''
+        # Only the last "capacity" samples of a larger write are kept (counted as written)
+        skipped = max(0, len(samples) - self.capacity)
+        self.written += skipped
+        samples = samples[skipped:]
+        start = self.written % self.capacity
+        first = min(len(samples), self.capacity - start)
+        self.buffer[start:start + first] = samples[:first]
+        self.buffer[:len(samples) - first] = samples[first:]
+        self.written += len(samples)
+
+        # Readers wait with a timeout: a missed wake up only delays them
+        if self.available.acquire(blocking=False):
+            self.available.notify_all()
+            self.available.release()
+
+    def copy(self, position: int, count: int) -> np.ndarray:
+        ''' Copy "count" samples from an absolute position (may be overwritten meanwhile) '''
+        start = position % self.capacity
+        first = min(count, self.capacity - start)
+        return np.concatenate((self.buffer[start:start + first], self.buffer[:count - first]))
+
+    def reader(self, name: str, history: int = 0) -> "PcmReader":
+        ''' New reader starting now (or "history" samples in the past) '''
+        reader = PcmReader(self, name, max(0, self.written - min(history, self.capacity)))
+        self.readers[name] = reader
+        return reader
+
+    def stats(self) -> dict:
+        ''' Written samples, lag and lost samples of each reader '''
+        return {
+            "written": self.written,
+            "readers": {name: {"lag": self.written - reader.position, "dropped": reader.dropped} for name, reader in list(self.readers.items())},
+        }
+
+class PcmReader():
+    ''' Cursor of one consumer on a PcmRing '''
+    def __init__(self, ring: PcmRing, name: str, position: int) -> None:
+        self.ring = ring
+        self.name = name
+        self.position = position
+        self.dropped = 0 # Samples overwritten before being read
+
+    def lag(self) -> int:
+        return self.ring.written - self.position
+
+    def skip_overrun(self) -> None:
+        ''' Move forward to the oldest sample still in the ring '''
+        oldest = self.ring.written - self.ring.capacity
+        if self.position < oldest:
+            self.dropped += oldest - self.position
+            self.position = oldest
+
+    def read(self, count: int, timeout: float | None = None) -> np.ndarray | None:
+        ''' Next "count" samples (blocking), None on timeout '''
+        count = min(count, self.ring.capacity)
+        with self.ring.available:
+            if not self.ring.available.wait_for(lambda: self.lag() >= count, timeout):
+                return None
+
+        while True:
+            self.skip_overrun()
+            samples = self.ring.copy(self.position, count)
+            # Overwritten during the copy: drop the torn samples and read again
+            if self.ring.written - self.position <= self.ring.capacity:
+                self.position += count
+                return samples
+
+    def close(self) -> None:
+        ''' Stop reading '''
+        self.ring.readers.pop(self.name, None)
@@ -0,0 +1,146 @@
+import asyncio
+import itertools
+import numpy as np
+import queue
+import threading
+from collections import deque
+from concurrent.futures import Future
+from enum import IntEnum
+from time import monotonic
+
+class Priority(IntEnum):
+    ''' Serial transactions priority (lower first) '''
+    EMERGENCY = 0 # Torque, emergency stop
+    MOTION = 1 # Goal writes
+    TELEMETRY = 2 # Reads
+
+class Job():
+    ''' A queued serial transaction '''
+    def __init__(self, func, args: tuple, kwargs: dict, future: Future | None) -> None:
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.future = future
+        self.queued = monotonic()
+
+class SerialScheduler():
+    '''
+        Single thread owning the serial port, serving a priority queue of transactions.
+        Pending motion goals of the same key (joint) are coalesced: only the newest is sent.
+    '''
+    def __init__(self, name = "uart", window = 5.0) -> None:
+        self.queue = queue.PriorityQueue()
+        self.sequence = itertools.count()
+        self.lock = threading.Lock()
+        self.goals: dict = {}
+        self.goal_futures: list[Future] = []
+        self.goals_queued = False
+        self.window = window # Bus utilization window in seconds
+
+        self.transactions = 0
+        self.coalesced = 0
+        self.failed = 0
+        self.max_depth = 0
+        self.history = deque(maxlen=1024) # (end, duration, latency)
+
+        self.running = True
+        self.thread = threading.Thread(target=self.run, name=name, daemon=True)
+        self.thread.start()
+
+    def put(self, priority: Priority, job: Job | None) -> None:
+        ''' Queue a job '''
+        self.queue.put((priority, next(self.sequence), job))
+        self.max_depth = max(self.max_depth, self.queue.qsize())
+
+    def submit(self, priority: Priority, func, *args, **kwargs) -> Future:
+        ''' Queue a transaction, its result is given by the future '''
+        future = Future()
+        self.put(priority, Job(func, args, kwargs, future))
+        return future
+
+    async def call(self, priority: Priority, func, *args, **kwargs):
+        ''' Queue a transaction and wait for its result '''
+        return await asyncio.wrap_future(self.submit(priority, func, *args, **kwargs))
+
+    def submit_goals(self, goals: dict, flush) -> Future:
+        '''
+            Queue motion goals {key: goal}. A goal replaces the pending goal of the same key
+            and all the pending goals are sent together by flush(goals) in one transaction.
+        '''
+        future = Future()
+        with self.lock:
+            for key, goal in goals.items():
+                if key in self.goals:
+                    self.coalesced += 1
+                self.goals[key] = goal
+            self.goal_futures.append(future)
+            if not self.goals_queued:
+                self.goals_queued = True
+                self.put(Priority.MOTION, Job(self.flush_goals, (flush,), {}, None))
+        return future
+
+    def flush_goals(self, flush) -> None:
+        ''' Send all pending goals (in the serial thread) '''
+        with self.lock:
+            goals, futures = self.goals, self.goal_futures
+            self.goals, self.goal_futures = {}, []
+            self.goals_queued = False
+
+        try:
+            result = flush(goals)
+        except BaseException as e:
+            for future in futures:
+                future.set_exception(e)
+            raise
+        for future in futures:
+            future.set_result(result)
+
+    def run(self) -> None:
+        ''' Serial thread '''
+        while self.running:
+            _priority, _sequence, job = self.queue.get()
+            if job is None:
+                break
+            if job.future is not None and not job.future.set_running_or_notify_cancel():
+                continue
+
+            start = monotonic()
+            try:
+                result = job.func(*job.args, **job.kwargs)
+                if job.future is not None:
+                    job.future.set_result(result)
+            except BaseException as e:
+                self.failed += 1
+                if job.future is not None:
+                    job.future.set_exception(e)
+                else:
+                    print(f"Serial transaction {getattr(job.func, '__qualname__', job.func)} failed: {e!r}")
+
+            end = monotonic()
+            self.transactions += 1
+            self.history.append((end, end - start, end - job.queued))
+
+    def stats(self) -> dict:
+        ''' Queue depth, bus utilization and transaction latency (in ms) '''
+        now = monotonic()
+        recent = np.array([h for h in list(self.history) if h[0] >= now - self.window]).reshape(-1, 3)
+        durations = recent[:, 1] * 1000
+        latencies = recent[:, 2] * 1000
+        return {
+            "depth": self.queue.qsize(),
+            "max_depth": self.max_depth,
+            "transactions": self.transactions,
+            "coalesced": self.coalesced,
+            "failed": self.failed,
+            "utilization": float(recent[:, 1].sum() / self.window),
+            "transaction_ms": float(durations.mean()) if len(recent) else 0.0,
+            "latency_ms": float(latencies.mean()) if len(recent) else 0.0,
+            "latency_p95_ms": float(np.percentile(latencies, 95)) if len(recent) else 0.0,
+            "latency_max_ms": float(latencies.max()) if len(recent) else 0.0,
+        }
+
+    def close(self) -> None:
+        ''' Stop the serial thread once the queued transactions are done '''
+        self.put(Priority.TELEMETRY, None)
+        self.thread.join(timeout=1)
+        self.running = False
@@ -0,0 +1,140 @@
+import asyncio
+import numpy as np
+from collections import deque
+from app.models import TrackingTarget
+from app.motor import MotorExeption
+
+class VisualServo():
+    '''
+        Fixed-rate closed loop centering the tracked target.
+        Each new target sets a joint goal: the commanded angles at its capture time plus the
+        image-space error converted to angles (camera field of view). A PID drives the commanded
+        angles to the goal with rate limits and constraint clamps.
+    '''
+    def __init__(self, controller, rate = 30.0, fov = (62.0, 48.0), kp = 4.0, ki = 0.0, kd = 0.1, max_rate = 60.0,
+                 pan = "bras_horizontal", tilt: dict[str, float] | None = None, pan_sign = 1.0, tilt_sign = 1.0, timeout = 1.0) -> None:
+        self.controller = controller
+        self.rate = rate # Hz
+        self.fov = fov # Horizontal, vertical field of view of the camera (degrees)
+        self.kp, self.ki, self.kd = kp, ki, kd
+        self.max_rate = max_rate # deg/s per joint
+        self.pan = pan
+        self.tilt = tilt or {"bras1": 0.3, "bras2": 0.7} # Share of the tilt per joint
+        self.pan_sign = pan_sign
+        self.tilt_sign = tilt_sign
+        self.timeout = timeout # Idle after this time without target (seconds)
+
+        self.target: TrackingTarget | None = None
+        self.joints: list[str] = []
+        self.q: np.ndarray | None = None # Commanded angles
+        self.goal: np.ndarray | None = None
+        self.history = deque(maxlen=64) # (time, commanded angles)
+        self.integral = None
+        self.previous_error = None
+        self.task: asyncio.Task | None = None
+
+        self.loops = 0
+        self.overruns = 0
+        self.max_lateness = 0.0
+        self.latencies = deque(maxlen=256) # Capture to motor command (seconds)
+
+    def update(self, target: TrackingTarget) -> None:
+        ''' Newest target (starts the loop if needed) '''
+        self.target = target
+        if self.task is None or self.task.done():
+            self.task = asyncio.get_running_loop().create_task(self.run())
+
+    def stop(self) -> None:
+        ''' Stop the loop '''
+        if self.task is not None:
+            self.task.cancel()
+
+    def commanded_at(self, timestamp: float) -> np.ndarray:
+        ''' Commanded angles at a time (the newest ones before it) '''
+        for time, q in reversed(self.history):
+            if time <= timestamp:
+                return q
+        return self.history[0][1] if self.history else self.q # type: ignore
+
+    def set_goal(self, target: TrackingTarget) -> None:
+        ''' Joint goal centering the target '''
+        goal = self.commanded_at(target.timestamp).copy()
+        goal[self.joints.index(self.pan)] += self.pan_sign * target.position.x * self.fov[0] / 2
+        for name, share in self.tilt.items():
+            goal[self.joints.index(name)] += self.tilt_sign * share * target.position.y * self.fov[1] / 2
+        self.goal = goal
+
+    def start(self, now: float) -> None:
+        ''' Start from the last known angles '''
+        self.joints = [self.pan, *self.tilt.keys()]
+        telemetry = self.controller.telemetry
+        self.q = np.array([telemetry[name].deg for name in self.joints])
+        self.goal = self.q.copy()
+        self.history.clear()
+        self.history.append((now, self.q.copy()))
+        self.integral = np.zeros(len(self.joints))
+        self.previous_error = np.zeros(len(self.joints))
+        limits = [self.controller.motors[name].world_limits() for name in self.joints]
+        # Keep strictly inside the constraints
+        self.low = np.array([low for low, _high in limits]) + 0.5
+        self.high = np.array([high for _low, high in limits]) - 0.5
+
+    async def run(self) -> None:
+        ''' Control loop '''
+        loop = asyncio.get_running_loop()
+        period = 1 / self.rate
+        self.controller.trajectory.stop()
+        try:
+            self.start(loop.time())
+        except KeyError as e:
+            print(f"Visual servoing: no telemetry for {e}")
+            return
+
+        handled = None
+        deadline = loop.time()
+        while True:
+            now = loop.time()
+            lateness = now - deadline
+            self.max_lateness = max(self.max_lateness, lateness)
+            if lateness > period:
+                self.overruns += 1
+                deadline = now
+
+            target = self.target
+            if target is not None and target is not handled:
+                handled = target
+                self.set_goal(target)
+                self.latencies.append(now - target.timestamp)
+            elif target is None or now - target.timestamp > self.timeout:
+                break
+
+            # PID on the goal error, rate limited then clamped
+            error = self.goal - self.q # type: ignore
+            self.integral += error * period
+            velocity = self.kp * error + self.ki * self.integral + self.kd * (error - self.previous_error) / period
+            self.previous_error = error
+            velocity = np.clip(velocity, -self.max_rate, self.max_rate)
+            self.q = np.clip(self.q + velocity * period, self.low, self.high)
+            self.history.append((now, self.q.copy()))
+
+            try:
+                self.controller.move_degrees(dict(zip(self.joints, self.q.tolist())))
+            except MotorExeption as e:
+                print(f"Visual servoing cancelled: {e}")
+                break
+
+            self.loops += 1
+            deadline += period
+            await asyncio.sleep(max(0.0, deadline - loop.time()))
+
+    def stats(self) -> dict:
+        ''' Loop and latency statistics (in ms) '''
+        latencies = np.array(self.latencies) * 1000
+        return {
+            "loops": self.loops,
+            "overruns": self.overruns,
+            "max_lateness_ms": self.max_lateness * 1000,
+            "latency_ms": float(latencies.mean()) if len(latencies) else 0.0,
+            "latency_p95_ms": float(np.percentile(latencies, 95)) if len(latencies) else 0.0,
+            "latency_max_ms": float(latencies.max()) if len(latencies) else 0.0,
+        }
@@ -0,0 +1,145 @@
+import asyncio
+from abc import ABC, abstractmethod
+import io
+import json
+import re
+import shutil
+import subprocess
+import wave
+import numpy as np
+from collections import deque
+from os import path
+from time import monotonic
+
+class SpeechEngine(ABC):
+    ''' Offline text to speech backend '''
+    @abstractmethod
+    def synthesize(self, text: str) -> tuple[np.ndarray, int]:
+        ''' PCM 16-bit mono samples of a text and their rate '''
+
+def require(binary: str) -> str:
+    ''' Check that a program is installed '''
+    found = shutil.which(binary)
+    if found is None:
+        raise IOError(f"Missing text to speech program {binary}")
+    return found
+
+class EspeakEngine(SpeechEngine):
+    ''' eSpeak NG (formant synthesis, very fast) '''
+    def __init__(self, voice = "fr", speed = 160, binary = "espeak-ng") -> None:
+        self.binary = require(binary)
+        self.voice = voice
+        self.speed = speed
+
+    def synthesize(self, text: str) -> tuple[np.ndarray, int]:
+        output = subprocess.run([self.binary, "--stdout", "-v", self.voice, "-s", str(self.speed), text],
+                                capture_output=True, check=True).stdout
+        with wave.open(io.BytesIO(output), "rb") as wav:
+            return np.frombuffer(wav.readframes(wav.getnframes()), dtype=np.int16), wav.getframerate()
+
+class PiperEngine(SpeechEngine):
+    ''' Piper (neural, ONNX voices) '''
+    def __init__(self, model = "app/data/fr_FR-siwis-medium.onnx", binary = "piper") -> None:
+        self.binary = require(binary)
+        if not path.exists(model):
+            raise IOError(f"Missing voice model {model}")
+        self.model = model
+        self.rate = 22050
+        if path.exists(f"{model}.json"):
+            with open(f"{model}.json") as file:
+                self.rate = json.load(file)["audio"]["sample_rate"]
+
+    def synthesize(self, text: str) -> tuple[np.ndarray, int]:
+        output = subprocess.run([self.binary, "--model", self.model, "--output_raw"],
+                                input=text.encode(), capture_output=True, check=True).stdout
+        return np.frombuffer(output, dtype=np.int16), self.rate
+
+ENGINES: dict[str, type[SpeechEngine]] = {
+    "espeak": EspeakEngine,
+    "piper": PiperEngine,
+}
+
+def create_engine(name: str, **options) -> SpeechEngine:
+    ''' Create a text to speech backend by name '''
+    engine = ENGINES.get(name)
+    if engine is None:
+        raise ValueError(f"Unknown speech engine {name} (available: {', '.join(ENGINES)})")
+    return engine(**options)
+
+def sentences(text: str) -> list[str]:
+    ''' Split a text in sentences (the first one can be spoken while the next are synthesized) '''
+    return [sentence.strip() for sentence in re.split(r"(?<=[.!?…;:])\s+|\n+", text) if sentence.strip()]
+
+def resample(samples: np.ndarray, rate: int, to: int) -> np.ndarray:
+    ''' Linear resampling (speech only needs it to match the output rate) '''
+    if rate == to or len(samples) == 0:
+        return samples
+    times = np.arange(round(len(samples) * to / rate)) * (rate / to)
+    return np.interp(times, np.arange(len(samples)), samples).astype(np.int16)
+
+class Speech():
+    '''
+        Speaks the "talk" texts: sentences are synthesized one by one (off the loop) and queued
+        to the player as soon as they are ready. A wake word interrupts the speech (barge-in).
+    '''
+    def __init__(self, audio, bus=None, engine = "espeak", options: dict | None = None) -> None:
+        self.audio = audio
+        self.bus = bus
+        self.engine: SpeechEngine | None = None
+        try:
+            self.engine = create_engine(engine, **(options or {}))
+        except IOError as e:
+            # Text to speech programs are system dependencies: run without speech
+            print(f"Speech disabled: {e}")
+        self.generation = 0
+        self.utterances = 0
+        self.cancelled = 0
+        self.ttfa = deque(maxlen=64) # Time to first audio (seconds)
+
+        if bus and self.engine is not None:
+            bus.subscribe("talk")(self.on_talk)
+            bus.subscribe("ai_wakeup")(self.on_wakeup)
+
+    async def on_talk(self, text: str) -> None:
+        ''' Speak a text (texts are queued, a long answer can be sent by chunks) '''
+        generation = self.generation
+        self.utterances += 1
+        requested = monotonic()
+        first = True
+
+        for sentence in sentences(text):
+            try:
+                samples, rate = await asyncio.to_thread(self.engine.synthesize, sentence) # type: ignore
+            except (OSError, subprocess.CalledProcessError) as e:
+                print(f"Speech synthesis failed: {e}")
+                return
+            if generation != self.generation:
+                return
+
+            started = None
+            if first:
+                started = lambda: self.ttfa.append(monotonic() - requested)
+                first = False
+            self.audio.play(resample(samples, rate, self.audio.rate), started)
+
+    async def on_wakeup(self) -> None:
+        ''' Barge-in: stop speaking '''
+        self.stop()
+
+    def stop(self) -> None:
+        ''' Cancel the current speech '''
+        self.generation += 1
+        self.cancelled += 1
+        self.audio.stop_playback()
+
+    def stats(self) -> dict:
+        ''' Time to first audio (ms) '''
+        ttfa = np.array(self.ttfa) * 1000
+        return {
+            "enabled": self.engine is not None,
+            "utterances": self.utterances,
+            "cancelled": self.cancelled,
+            "ttfa_ms": float(ttfa.mean()) if len(ttfa) else 0.0,
+            "ttfa_p95_ms": float(np.percentile(ttfa, 95)) if len(ttfa) else 0.0,
+            "ttfa_last_ms": float(ttfa[-1]) if len(ttfa) else 0.0,
+        }
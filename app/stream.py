@@ -0,0 +1,97 @@
+import cv2
+import asyncio
+from time import monotonic
+from app.camera import Camera, Frame
+
+class Stream():
+    ''' Camera JPEG stream: each frame is encoded once and shared by all clients '''
+    def __init__(self, camera: Camera, fps = 10, quality = 70, width: int | None = 640, max_age = 0.5, boundary = "frame") -> None:
+        self.camera = camera
+        self.fps = fps
+        self.quality = quality
+        self.width = width
+        self.max_age = max_age
+        self.boundary = boundary
+        self.jpeg: bytes | None = None
+        self.frame_id = 0
+        self.timestamp = 0.0
+        self.clients = 0
+        self.encoded = 0
+        self.lock = asyncio.Lock()
+        self.new_jpeg = asyncio.Condition()
+        self.wanted = asyncio.Event()
+
+    def encode(self, frame: Frame) -> bytes:
+        ''' Encode a frame in JPEG (resized to the stream width) '''
+        image = frame.image
+        h, w, _c = image.shape
+        if self.width and w > self.width:
+            image = cv2.resize(image, (self.width, round(h * self.width / w)), interpolation=cv2.INTER_AREA)
+
+        ret, jpeg = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+        if not ret:
+            raise IOError("Failed to encode frame")
+        return jpeg.tobytes()
+
+    async def publish(self, frame: Frame) -> bytes:
+        ''' Encode a frame (if not already done) and wake up the clients '''
+        async with self.lock:
+            if frame.id <= self.frame_id and self.jpeg is not None:
+                return self.jpeg
+
+            jpeg = await asyncio.to_thread(self.encode, frame)
+            self.encoded += 1
+            async with self.new_jpeg:
+                self.jpeg, self.frame_id, self.timestamp = jpeg, frame.id, frame.timestamp
+                self.new_jpeg.notify_all()
+            return jpeg
+
+    async def update(self) -> None:
+        ''' Encode the camera frames while clients are connected '''
+        while self.camera.running:
+            if self.clients == 0:
+                self.wanted.clear()
+                await self.wanted.wait()
+
+            frame = await asyncio.to_thread(self.camera.wait, self.frame_id, 1.0)
+            if frame is not None and frame.id > self.frame_id:
+                await self.publish(frame)
+            await asyncio.sleep(1/self.fps)
+
+    async def snapshot(self) -> bytes:
+        ''' Get the newest JPEG (reused when younger than max_age) '''
+        if self.jpeg is not None and monotonic() - self.timestamp <= self.max_age:
+            return self.jpeg
+
+        frame = self.camera.latest()
+        if frame is None:
+            raise IOError("No frame captured yet")
+        return await self.publish(frame)
+
+    async def frames(self):
+        ''' Multipart MJPEG stream (a slow client skips frames) '''
+        self.clients += 1
+        self.wanted.set()
+        try:
+            last_id = 0
+            while True:
+                async with self.new_jpeg:
+                    await self.new_jpeg.wait_for(lambda: self.frame_id > last_id)
+                    jpeg, last_id = self.jpeg, self.frame_id
+
+                yield (
+                    f"--{self.boundary}\r\n"
+                    f"Content-Type: image/jpeg\r\n"
+                    f"Content-Length: {len(jpeg)}\r\n\r\n"
+                ).encode() + jpeg + b"\r\n"
+        finally:
+            self.clients -= 1
+
+    def stats(self) -> dict:
+        ''' Stream counters '''
+        return {
+            "clients": self.clients,
+            "encoded": self.encoded,
+            "frame_id": self.frame_id,
+            "camera_frame_id": self.camera.frame_id,
+        }
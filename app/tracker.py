@@ -0,0 +1,116 @@
+import cv2
+import numpy as np
+
+class FlowTracker():
+    ''' Follow a box between frames with the optical flow (Lucas-Kanade) of its feature points '''
+    grayscale = True # Input image: grayscale or BGR
+
+    def __init__(self, max_points = 40, min_points = 6) -> None:
+        self.max_points = max_points
+        self.min_points = min_points
+        self.gray = None
+        self.points = None
+        self.box = None
+        self.seeded = 0
+        self.confidence = 0.0
+        self.motion = 0.0 # Last shift, relative to the box size
+
+    def init(self, gray, box: tuple) -> bool:
+        ''' Seed the tracker with a box (x, y, w, h) on a grayscale image '''
+        x, y, w, h = [int(v) for v in box]
+        mask = np.zeros(gray.shape[:2], dtype=np.uint8)
+        mask[max(0, y):y+h, max(0, x):x+w] = 255
+        points = cv2.goodFeaturesToTrack(gray, maxCorners=self.max_points, qualityLevel=0.01, minDistance=3, mask=mask)
+        if points is None or len(points) < self.min_points:
+            self.reset()
+            return False
+
+        self.gray = gray
+        self.points = points
+        self.box = (x, y, w, h)
+        self.seeded = len(points)
+        self.confidence = 1.0
+        self.motion = 0.0
+        return True
+
+    def update(self, gray) -> tuple | None:
+        ''' Move the box on a new grayscale image, None when the target is lost '''
+        if self.box is None:
+            return None
+
+        points, status, _err = cv2.calcOpticalFlowPyrLK(self.gray, gray, self.points, None, winSize=(15, 15), maxLevel=2)
+        good = status.ravel() == 1 if status is not None else np.zeros(0, dtype=bool)
+        if points is None or good.sum() < self.min_points:
+            self.reset()
+            return None
+
+        shift = np.median(points[good] - self.points[good], axis=0).ravel()
+        x, y, w, h = self.box
+        self.box = (x + float(shift[0]), y + float(shift[1]), w, h)
+        self.gray = gray
+        self.points = points[good].reshape(-1, 1, 2)
+        self.confidence = good.sum() / self.seeded
+        self.motion = float(np.hypot(shift[0], shift[1])) / max(w, h)
+        return self.box
+
+    def reset(self) -> None:
+        ''' Forget the target '''
+        self.gray = None
+        self.points = None
+        self.box = None
+        self.confidence = 0.0
+        self.motion = 0.0
+
+class KcfTracker():
+    ''' Follow a box between frames with a KCF correlation filter (opencv-contrib) '''
+    grayscale = False
+
+    def __init__(self) -> None:
+        self.tracker = None
+        self.box = None
+        self.confidence = 0.0
+        self.motion = 0.0
+
+    @staticmethod
+    def available() -> bool:
+        ''' The KCF tracker is only in the opencv-contrib build '''
+        return hasattr(cv2, "TrackerKCF_create")
+
+    def init(self, image, box: tuple) -> bool:
+        ''' Seed the tracker with a box (x, y, w, h) on a BGR image '''
+        box = tuple(int(v) for v in box)
+        if box[2] <= 0 or box[3] <= 0:
+            self.reset()
+            return False
+        self.tracker = cv2.TrackerKCF_create() # type: ignore
+        self.tracker.init(image, box)
+        self.box = box
+        self.confidence = 1.0
+        self.motion = 0.0
+        return True
+
+    def update(self, image) -> tuple | None:
+        ''' Move the box on a new BGR image, None when the target is lost '''
+        if self.tracker is None:
+            return None
+
+        found, box = self.tracker.update(image)
+        if not found:
+            self.reset()
+            return None
+
+        x, y, w, h = self.box # type: ignore
+        self.motion = float(np.hypot(box[0] - x, box[1] - y)) / max(w, h)
+        self.box = tuple(box)
+        return self.box
+
+    def reset(self) -> None:
+        ''' Forget the target '''
+        self.tracker = None
+        self.box = None
+        self.confidence = 0.0
+        self.motion = 0.0
+
+def create_object_tracker():
+    ''' Fastest tracker available for a generic object '''
+    return KcfTracker() if KcfTracker.available() else FlowTracker()
@@ -1,23 +1,78 @@
 from enum import Enum
-from app.models import Normalized, TrackingModeEnum
-from math import sqrt
-from app.eventbus import bus
-from time import time_ns
+from app.camera import Frame
+from app.models import Point, TrackingModeEnum, TrackingSubjects, TrackingTarget
+from math import ceil, sqrt
+from app.eventbus import Offload, bus
+from app.tracker import FlowTracker, create_object_tracker
+from app.kalman import KalmanTarget
+from app.detector import create_detector
+from app.pool import DetectionPool
+from time import monotonic, perf_counter
 import cv2
 
 class Tracking():
-    def __init__(self, bus=None, distance = 0.5, speed = 1, debug = False) -> None:
+    def __init__(self, bus=None, distance = 0.5, speed = 1, debug = False, actuation_delay = 0.1,
+                 scale_factor = 1.1, min_size = 200, downscale = 2, roi_margin = 0.5, max_misses = 5,
+                 detect_every = 10, min_confidence = 0.5, motion_reference = 0.05, workers = 0,
+                 detector = "haar", detector_options: dict | None = None, object_budget = 0.01) -> None:
         self.bus = bus
         self.debug = debug
-        self.classifier = cv2.CascadeClassifier("app/data/haarcascade_frontalface_default.xml")
         self.tracking_mode = TrackingModeEnum.FACE
         self.distance = distance
         self.speed = speed
-        self.last_normalized_point = None
-        self.last_measurement = time_ns()
+
+        # Target filter, predicted "capture to actuation" latency ahead
+        # (measured capture to emit latency + actuation_delay)
+        self.filter = KalmanTarget()
+        self.actuation_delay = actuation_delay
+        self.latency: float | None = None
+        self.frame_timestamp = monotonic()
+
+        # Face search (sizes in pixels of the full frame)
+        self.scale_factor = scale_factor
+        self.min_size = min_size
+        self.downscale = downscale
+        self.roi_margin = roi_margin
+        self.max_misses = max_misses
+        self.face = None # Last face (x, y, w, h) in the downscaled frame
+        self.face_velocity = (0.0, 0.0) # In downscaled pixels per frame
+        self.misses = 0
+
+        # Face detector backend (see app/detector.py), sizes in the downscaled frame
+        self.detector_name = detector
+        self.detector_options = {"min_size": self.scaled_min_size(), **(detector_options or {})}
+        if detector == "haar":
+            self.detector_options.setdefault("scale_factor", scale_factor)
+        self.detector = create_detector(detector, **self.detector_options)
+
+        # Detect-then-track: the detector runs every "detect_interval" frames (at most
+        # "detect_every"), fewer when the target moves fast or the tracker lose confidence
+        self.tracker = FlowTracker()
+        self.detect_every = detect_every
+        self.detect_interval = detect_every
+        self.min_confidence = min_confidence
+        self.motion_reference = motion_reference
+        self.tracked_frames = 0
+
+        # Detection in worker processes (0: in the tracking thread)
+        self.workers = workers
+        self.pool: DetectionPool | None = None
+
+        # Object tracking (seeded by the AI), average cost per camera frame under object_budget seconds
+        self.object_tracker = create_object_tracker()
+        self.subject: TrackingSubjects | None = None
+        self.seeded = False
+        self.object_budget = object_budget
+        self.object_cost = 0.0
+        self.object_skip = 1
+        self.object_frames = 0
+
+        # Mode changes are applied by the tracking thread on the next frame
+        self.pending_mode = None
 
         if self.bus:
-            self.bus.subscribe("camera_frame")(self.on_frame)
+            self.bus.subscribe("camera_frame", offload=Offload.THREAD)(self.on_frame)
+            self.bus.subscribe("tracking_mode")(self.on_change_tracking_mode)
 
     def debug_frame(self, frame: bytes):
         if self.debug:
@@ -29,83 +84,259 @@ class Tracking():
             cv2.imshow("Tracking", frame) # type: ignore
             cv2.waitKey(1)
 
-    def normal_tracking(self, frame: bytes, normal: Normalized):
+    def normal_tracking(self, frame: bytes, normal: Point):
         ''' Track a normal point on the frame '''
         h, w, _c = frame.shape # type: ignore
-        distance_from_center = sqrt(normal.x**2 + normal.y**2)
         to_target = None
 
-        # Moving speed
-        measure_time = time_ns()
-        speed = 0
-        if self.last_normalized_point is not None:
-            normal_speed_x = (normal.x - self.last_normalized_point.x) / ((time_ns() - self.last_measurement) / 1000000000)
-            normal_speed_y = (normal.y - self.last_normalized_point.y) / ((time_ns() - self.last_measurement) / 1000000000)
-            speed = sqrt(normal_speed_x**2 + normal_speed_y**2)
+        # Filtered target, predicted at the time the motors will act on it
+        self.filter.update(self.frame_timestamp, normal.x, normal.y)
+        latency = monotonic() - self.frame_timestamp
+        self.latency = latency if self.latency is None else self.latency + 0.1 * (latency - self.latency)
+        horizon = self.latency + self.actuation_delay
 
-        self.last_measurement = measure_time
-        self.last_normalized_point = normal
+        vx, vy = self.filter.velocity()
+        speed = sqrt(vx**2 + vy**2)
+        if speed > self.speed:
+            # Don't extrapolate a (probably wrong) fast move too far
+            vx, vy = vx * self.speed / speed, vy * self.speed / speed
+        x, y = self.filter.position()
+        px = min(max(x + vx * horizon, -1.0), 1.0)
+        py = min(max(y + vy * horizon, -1.0), 1.0)
+        distance_from_center = sqrt(px**2 + py**2)
 
-        # If outside of the circle in a resonable speed. Move to target.
+        # If outside of the circle. Move to target.
         if distance_from_center > self.distance:
-            xcenter = round(((w/2)*normal.x) + (w/2))
-            ycenter = round(((h/2)*normal.y) + (h/2))
-
             if self.debug:
-                print(f"Tracking point at ({normal.x}, {normal.y}) with speed {speed}")
-                if speed < self.speed:
-                    cv2.circle(frame, (xcenter, ycenter), 5, (0, 255, 0), -1) # type: ignore
-                else:
-                    cv2.circle(frame, (xcenter, ycenter), 5, (0, 0, 255), -1) # type: ignore
+                print(f"Tracking point at ({normal.x}, {normal.y}) predicted at ({px}, {py}) with speed {speed}")
+                cv2.circle(frame, (round(((w/2)*normal.x) + (w/2)), round(((h/2)*normal.y) + (h/2))), 5, (0, 255, 0), -1) # type: ignore
+                cv2.circle(frame, (round(((w/2)*px) + (w/2)), round(((h/2)*py) + (h/2))), 5, (0, 0, 255), -1) # type: ignore
 
-            if speed < self.speed:
-                to_target = normal
-                if self.bus:
-                    self.bus.emit("move_tracking", to_target)
+            to_target = TrackingTarget(
+                position=Point(px, py), vx=vx, vy=vy,
+                timestamp=self.frame_timestamp, horizon=horizon,
+            )
+            if self.bus:
+                self.bus.emit("controller_move_tracking", to_target)
 
         self.debug_frame(frame)
         return to_target
 
     def lost_tracking(self, frame: bytes | None):
-        self.last_normalized_point = None
-        self.last_measurement = time_ns()
+        self.filter.reset()
 
-        if frame:
+        if frame is not None:
             self.debug_frame(frame)
 
-    def face_tracking(self, frame: bytes):
+    def scaled_min_size(self) -> int:
+        ''' Minimum face size in the downscaled frame '''
+        return max(1, round(self.min_size / self.downscale))
+
+    def detect(self, image, roi: tuple[int, int, int, int] | None = None) -> list:
+        ''' Detect faces in the detector image, or only in its region (x, y, w, h) '''
+        return self.detector.detect(image, roi)
+
+    def search_window(self, w: int, h: int) -> tuple[int, int, int, int] | None:
+        ''' Region where the face should be (velocity predicted), None for a full-frame scan '''
+        if self.face is None or self.misses >= self.max_misses:
+            return None
+
+        x, y, wf, hf = self.face
+        vx, vy = self.face_velocity
+        # Predicted center, the window grows with each miss
+        xcenter = x + wf / 2 + vx * (self.misses + 1)
+        ycenter = y + hf / 2 + vy * (self.misses + 1)
+        margin = self.roi_margin * (1 + self.misses)
+        half_w = wf * (0.5 + margin) + abs(vx)
+        half_h = hf * (0.5 + margin) + abs(vy)
+
+        x0 = max(0, round(xcenter - half_w))
+        y0 = max(0, round(ycenter - half_h))
+        x1 = min(w, round(xcenter + half_w))
+        y1 = min(h, round(ycenter + half_h))
+        min_size = self.min_size / self.downscale
+        if x1 - x0 < min_size or y1 - y0 < min_size:
+            return None
+        return (x0, y0, x1 - x0, y1 - y0)
+
+    def face_tracking(self, frame: bytes, frame_id: int = 0):
         ''' Search for a face in the frame and track it '''
         h, w, _c = frame.shape # type: ignore
 
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) # type: ignore
+        # Search on a downscaled frame, around the last face when possible
+        sw, sh = w // self.downscale, h // self.downscale
+        small = frame
+        if self.downscale > 1:
+            small = cv2.resize(frame, (sw, sh), interpolation=cv2.INTER_AREA) # type: ignore
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY) # type: ignore
+        image = gray if self.detector.grayscale else small
+
+        if self.workers > 0:
+            if self.pool is None:
+                self.pool = DetectionPool(image.shape, workers=self.workers, detector=self.detector_name, options=self.detector_options)
+            return self.pool_tracking(frame, gray, image, frame_id)
 
-        faces = self.classifier.detectMultiScale(
-		gray, scaleFactor=1.05, minNeighbors=5, minSize=(200, 200),
-		flags=cv2.CASCADE_SCALE_IMAGE)
+        # Cheap inter-frame tracking between two detections
+        if self.face is not None and self.tracked_frames < self.detect_interval:
+            box = self.tracker.update(gray)
+            if box is not None and self.tracker.confidence >= self.min_confidence:
+                self.tracked_frames += 1
+                self.detect_interval = max(1, round(self.detect_every / (1 + self.tracker.motion / self.motion_reference)))
+                return self.follow_face(frame, box, sw, sh)
 
-        if faces is not None and len(faces) > 0:
-            (x, y, wf, hf) = faces[0]
-            xcenter = round(x + wf / 2)
-            ycenter = round(y + hf / 2)
+        faces = self.detect(image, self.search_window(sw, sh))
 
-            normal = Normalized(x=((2*xcenter)/w)-1, y=((2*ycenter)/h)-1)
-            return self.normal_tracking(frame, normal)
+        if len(faces) > 0:
+            self.tracker.init(gray, faces[0])
+            self.tracked_frames = 0
+            return self.follow_face(frame, faces[0], sw, sh)
         else:
+            self.tracker.reset()
+            self.misses += 1
+            if self.misses > self.max_misses:
+                self.face = None
+                self.face_velocity = (0.0, 0.0)
             return self.lost_tracking(frame)
 
+    def pool_tracking(self, frame: bytes, gray, image, frame_id: int):
+        ''' Track between the detections of the worker pool (only the newest detection is used) '''
+        sh, sw = gray.shape
+        box = None
+        if self.face is not None:
+            box = self.tracker.update(gray)
+            if box is not None and self.tracker.confidence >= self.min_confidence:
+                self.tracked_frames += 1
+                self.detect_interval = max(1, round(self.detect_every / (1 + self.tracker.motion / self.motion_reference)))
+            else:
+                box = None
+
+        # While tracking one detection in flight is enough, when searching use all workers
+        detection_due = box is None or self.tracked_frames >= self.detect_interval
+        if detection_due and (box is None or self.pool.busy() == 0):
+            self.pool.submit(image, frame_id, self.search_window(sw, sh))
+
+        result = self.pool.poll()
+        if result is not None:
+            slot, _frame_id, faces = result
+            if len(faces) > 0:
+                # Seed on the detected frame then catch up with the current one
+                box = faces[0]
+                seed = self.pool.frame(slot)
+                if seed.ndim == 3:
+                    seed = cv2.cvtColor(seed, cv2.COLOR_BGR2GRAY)
+                if self.tracker.init(seed, box):
+                    box = self.tracker.update(gray) or box
+                self.tracked_frames = 0
+            elif box is None:
+                self.misses += 1
+                if self.misses > self.max_misses:
+                    self.face = None
+                    self.face_velocity = (0.0, 0.0)
+            self.pool.release(slot)
+
+        if box is not None:
+            return self.follow_face(frame, box, sw, sh)
+        return self.lost_tracking(frame)
+
+    def follow_face(self, frame: bytes, face: tuple, w: int, h: int):
+        ''' Update the face state and track its center (face in a w*h downscaled frame) '''
+        (x, y, wf, hf) = face
+        if self.face is not None:
+            frames = self.misses + 1
+            self.face_velocity = (
+                ((x + wf / 2) - (self.face[0] + self.face[2] / 2)) / frames,
+                ((y + hf / 2) - (self.face[1] + self.face[3] / 2)) / frames,
+            )
+        self.face = (x, y, wf, hf)
+        self.misses = 0
+
+        xcenter = min(max(x + wf / 2, 0), w)
+        ycenter = min(max(y + hf / 2, 0), h)
+        normal = Point(((2*xcenter)/w)-1, ((2*ycenter)/h)-1)
+        return self.normal_tracking(frame, normal)
+
     def object_tracking(self, frame: bytes):
         ''' Search for an object in the frame and track it '''
-        # Implement object tracking logic here
-        return None
+        if self.subject is None:
+            return self.lost_tracking(frame)
 
-    async def on_change_tracking_mode(self, mode: TrackingModeEnum) -> None:
-        '''  Change the tracking mode'''
-        self.lost_tracking(None)
+        # Stay under the time budget: only update on one frame every "object_skip"
+        self.object_frames += 1
+        if self.seeded and self.object_frames % self.object_skip != 0:
+            self.debug_frame(frame)
+            return None
+
+        start = perf_counter()
+        h, w, _c = frame.shape # type: ignore
+        sw, sh = w // self.downscale, h // self.downscale
+        small = frame
+        if self.downscale > 1:
+            small = cv2.resize(frame, (sw, sh), interpolation=cv2.INTER_AREA) # type: ignore
+        image = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY) if self.object_tracker.grayscale else small # type: ignore
+
+        if not self.seeded:
+            # AI bbox: (x, y, w, h) normalized between 0 and 1 from the top left corner
+            bx, by, bw, bh = self.subject.bbox
+            box = (bx * sw, by * sh, bw * sw, bh * sh)
+            self.seeded = self.object_tracker.init(image, box)
+        else:
+            box = self.object_tracker.update(image)
+            if box is not None and self.object_tracker.confidence < self.min_confidence:
+                box = None
+
+        cost = perf_counter() - start
+        self.object_cost += 0.2 * (cost - self.object_cost)
+        self.object_skip = max(1, ceil(self.object_cost / self.object_budget))
+
+        if not self.seeded or box is None:
+            # Lost: report it (it can be requested again) and go back to following faces
+            print(f"Object {self.subject.name} lost, back to face tracking")
+            if self.bus:
+                self.bus.emit("tracking_lost", self.subject)
+            self.pending_mode = (TrackingModeEnum.FACE, None)
+            self.apply_tracking_mode()
+            return self.lost_tracking(frame)
+
+        x, y, bw, bh = box
+        xcenter = min(max(x + bw / 2, 0), sw)
+        ycenter = min(max(y + bh / 2, 0), sh)
+        normal = Point(((2*xcenter)/sw)-1, ((2*ycenter)/sh)-1)
+        return self.normal_tracking(frame, normal)
+
+    def on_change_tracking_mode(self, mode: TrackingModeEnum, subjects: TrackingSubjects | None = None) -> None:
+        '''  Change the tracking mode (and the object to track) '''
+        self.pending_mode = (TrackingModeEnum(mode), subjects)
+
+    def apply_tracking_mode(self) -> None:
+        ''' Apply the last requested tracking mode '''
+        mode, subjects = self.pending_mode # type: ignore
+        self.pending_mode = None
+        if mode == TrackingModeEnum.OBJECT and (subjects is None or len(subjects.bbox) != 4):
+            print(f"Invalid object to track {subjects}, back to face tracking")
+            mode, subjects = TrackingModeEnum.FACE, None
         self.tracking_mode = mode
+        self.face = None
+        self.misses = 0
+        self.tracker.reset()
+        self.subject = subjects if mode == TrackingModeEnum.OBJECT else None
+        self.seeded = False
+        self.object_tracker.reset()
+        self.lost_tracking(None)
 
-    async def on_frame(self, frame):
-        ''' Track on the frame  '''
+    def on_frame(self, frame: Frame):
+        ''' Track on the frame (CPU-bound, run in a thread) '''
+        # The camera frame is shared (read-only), draw the debug on a copy
+        image = frame.image.copy() if self.debug else frame.image
+        self.frame_timestamp = frame.timestamp
+        if self.pending_mode is not None:
+            self.apply_tracking_mode()
         if self.tracking_mode == TrackingModeEnum.FACE:
-            return self.face_tracking(frame)
+            return self.face_tracking(image, frame.id)
         elif self.tracking_mode == TrackingModeEnum.OBJECT:
-            return self.object_tracking(frame)
\ No newline at end of file
+            return self.object_tracking(image)
+
+    def close(self) -> None:
+        ''' Stop the detection workers '''
+        if self.pool is not None:
+            self.pool.close()
+            self.pool = None
@@ -0,0 +1,177 @@
+import asyncio
+import numpy as np
+from app.models import Angle, Position
+from app.motor import MotorExeption
+from app.world import JOINTS, direct_batch, inverse_batch
+
+class Quintic():
+    '''
+        Quintic profile from (p0, v0, a0) to (p1, 0, 0) in "duration" seconds, on each axis.
+        Starting at rest it is the minimum-jerk profile.
+    '''
+    def __init__(self, p0: np.ndarray, v0: np.ndarray, a0: np.ndarray, p1: np.ndarray, duration: float) -> None:
+        t = max(duration, 1e-6)
+        h = p1 - p0
+        self.duration = duration
+        self.target = p1
+        self.c = np.array([
+            p0,
+            v0,
+            a0 / 2,
+            (20 * h - 12 * v0 * t - 3 * a0 * t**2) / (2 * t**3),
+            (-30 * h + 16 * v0 * t + 3 * a0 * t**2) / (2 * t**4),
+            (12 * h - 6 * v0 * t - a0 * t**2) / (2 * t**5),
+        ])
+
+    def sample(self, t: float) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        ''' Position, velocity and acceleration at a time (seconds from the start) '''
+        if t >= self.duration:
+            zero = np.zeros_like(self.target)
+            return self.target.copy(), zero, zero
+        c = self.c
+        p = c[0] + t * (c[1] + t * (c[2] + t * (c[3] + t * (c[4] + t * c[5]))))
+        v = c[1] + t * (2 * c[2] + t * (3 * c[3] + t * (4 * c[4] + t * 5 * c[5])))
+        a = 2 * c[2] + t * (6 * c[3] + t * (12 * c[4] + t * 20 * c[5]))
+        return p, v, a
+
+    def positions(self, times: np.ndarray) -> np.ndarray:
+        ''' Positions at several times, one row per time '''
+        times = np.minimum(times, self.duration)
+        return (times[:, None] ** np.arange(6)) @ self.c
+
+    @staticmethod
+    def duration_for(p0: np.ndarray, v0: np.ndarray, p1: np.ndarray, max_velocity: np.ndarray, min_duration = 0.2) -> float:
+        ''' Shortest duration keeping the peak velocity (1.875 h / T from rest) under max_velocity '''
+        return float(max(min_duration, np.max((1.875 * np.abs(p1 - p0) + np.abs(v0) * 0.5) / max_velocity)))
+
+def end_effector(angles: dict[str, float]) -> np.ndarray:
+    ''' Position (mm) of the cone pivot for world angles '''
+    return direct_batch(np.array([[angles.get(name, 0.0) for name in JOINTS]]))[0, 3]
+
+class Trajectory():
+    '''
+        Streams a smooth trajectory to the motors at a fixed control rate (batched writes).
+        A joint or Cartesian goal preempts the running trajectory from its current
+        position, velocity and acceleration (no stop).
+    '''
+    def __init__(self, controller, rate = 50.0, cartesian_speed = 150.0) -> None:
+        self.controller = controller
+        self.rate = rate # Hz
+        self.cartesian_speed = cartesian_speed # mm/s
+        self.joints: list[str] = []
+        self.segment: Quintic | None = None
+        self.cartesian = False
+        self.waypoints: np.ndarray | None = None # Joint angles of a Cartesian segment, one per control period
+        self.start = 0.0
+        self.task: asyncio.Task | None = None
+        self.overruns = 0
+
+    def now(self) -> float:
+        return asyncio.get_running_loop().time()
+
+    def joint_velocity(self) -> np.ndarray:
+        ''' Max joint velocities (deg/s) from the motors speed (steps/s) '''
+        return np.array([max(self.controller.motor(name).speed, 1) * 360 / 4096 for name in self.joints])
+
+    def joint_state(self) -> tuple[np.ndarray, np.ndarray]:
+        ''' Commanded joint angles and velocities now (from the motors when idle) '''
+        if self.segment is not None:
+            t = self.now() - self.start
+            if self.cartesian:
+                q = self.waypoint(t)
+                previous = self.waypoint(t - 1 / self.rate)
+                return q, (q - previous) * self.rate
+            q, v, _a = self.segment.sample(t)
+            return q, v
+
+        self.joints = list(self.controller.motors.keys())
+        telemetry = self.controller.telemetry
+        missing = [name for name in self.joints if name not in telemetry]
+        if missing:
+            raise ValueError(f"No telemetry for {', '.join(missing)}")
+        return np.array([telemetry[name].deg for name in self.joints]), np.zeros(len(self.joints))
+
+    def waypoint(self, t: float) -> np.ndarray:
+        ''' Joint angles of the Cartesian segment at a time '''
+        index = min(max(round(t * self.rate), 0), len(self.waypoints) - 1) # type: ignore
+        return self.waypoints[index] # type: ignore
+
+    def move_joints(self, angles: dict[str, Angle]) -> None:
+        ''' Move to joint angles (world), other joints keep their goal (constraints checked before moving) '''
+        for name, angle in angles.items():
+            self.controller.motor(name).encode_world_deg(angle.deg)
+
+        q, v = self.joint_state()
+        a = np.zeros_like(q) if self.segment is None or self.cartesian else self.segment.sample(self.now() - self.start)[2]
+        target = q.copy()
+        for name, angle in angles.items():
+            if name not in self.joints:
+                raise ValueError(f"Unknown joint {name}")
+            target[self.joints.index(name)] = angle.deg
+
+        duration = Quintic.duration_for(q, v, target, self.joint_velocity())
+        self.play(Quintic(q, v, a, target, duration), cartesian=False)
+
+    def move_position(self, position: Position) -> None:
+        ''' Move the cone pivot to a position in a straight line '''
+        target = np.array([position.x, position.y, position.z])
+        now = self.now()
+        if self.segment is not None and self.cartesian:
+            p, v, a = self.segment.sample(now - self.start)
+        else:
+            q, _v = self.joint_state()
+            p, v, a = end_effector(dict(zip(self.joints, q.tolist()))), np.zeros(3), np.zeros(3)
+
+        duration = Quintic.duration_for(p, v, target, np.full(3, self.cartesian_speed))
+        segment = Quintic(p, v, a, target, duration)
+
+        # Joint angles of every waypoint, rejected before moving if one is unreachable
+        steps = int(np.ceil(duration * self.rate)) + 1
+        angles, valid = inverse_batch(segment.positions(np.arange(steps) / self.rate), self.controller.joint_limits())
+        if not valid.all():
+            raise ValueError(f"Unable to join position (unreachable after {np.argmin(valid) / self.rate:.2f}s)")
+
+        self.waypoints = angles[:, [JOINTS.index(name) for name in self.joints]]
+        self.play(segment, cartesian=True)
+
+    def play(self, segment: Quintic, cartesian: bool) -> None:
+        ''' Replace the running segment, start streaming if needed '''
+        self.segment = segment
+        self.cartesian = cartesian
+        self.start = self.now()
+        if self.task is None or self.task.done():
+            self.task = asyncio.get_running_loop().create_task(self.run())
+
+    def stop(self) -> None:
+        ''' Stop streaming (the motors keep their last goal) '''
+        self.segment = None
+        if self.task is not None:
+            self.task.cancel()
+
+    async def run(self) -> None:
+        ''' Stream the samples at the control rate '''
+        period = 1 / self.rate
+        deadline = self.now()
+        while self.segment is not None:
+            t = self.now() - self.start
+            if self.cartesian:
+                q = self.waypoint(t)
+            else:
+                q = self.segment.sample(t)[0]
+
+            try:
+                self.controller.move_degrees(dict(zip(self.joints, q.tolist())))
+            except MotorExeption as e:
+                print(f"Trajectory cancelled: {e}")
+                self.segment = None
+                break
+
+            if t >= self.segment.duration:
+                self.segment = None
+                break
+
+            deadline += period
+            if deadline < self.now():
+                self.overruns += 1
+                deadline = self.now()
+            await asyncio.sleep(deadline - self.now())
@@ -0,0 +1,92 @@
+import numpy as np
+from collections import deque
+
+class VoiceGate():
+    '''
+        Cheap voice activity gate on whole frames, in front of the wake word model.
+        A frame is speech-like when its RMS energy is over the (adaptive) noise floor and its
+        zero-crossing rate is in the voice range; an optional VAD model confirms it.
+        The gate stays open "hangover" seconds after the last speech frame and replays
+        "preroll" seconds of audio when it opens, so the start of a word is not cut.
+    '''
+    def __init__(self, rate = 16000, frame = 1280, min_rms = 300.0, noise_ratio = 3.0, zcr = (0.02, 0.35),
+                 hangover = 0.5, preroll = 0.3, vad_threshold: float | None = None) -> None:
+        self.frame = frame
+        self.min_rms = min_rms # int16 units
+        self.noise_ratio = noise_ratio # Speech energy over the noise floor
+        self.zcr = zcr # Zero crossings per sample
+        self.hangover = max(1, round(hangover * rate / frame)) # Frames
+        self.preroll = deque(maxlen=max(0, round(preroll * rate / frame)))
+        self.noise = min_rms / noise_ratio
+
+        self.vad = None
+        self.vad_threshold = vad_threshold
+        if vad_threshold is not None:
+            from openwakeword.vad import VAD
+            self.vad = VAD()
+
+        self.open = False
+        self.remaining = 0
+        self.opened = 0
+        self.closed = 0
+        self.frames = 0
+        self.passed = 0
+
+    def speech(self, frames: np.ndarray) -> np.ndarray:
+        ''' Speech-like mask of (n, frame) int16 frames '''
+        samples = frames.astype(np.float32)
+        rms = np.sqrt(np.mean(samples**2, axis=1))
+        crossings = np.count_nonzero(np.diff(np.signbit(frames), axis=1), axis=1) / frames.shape[1]
+        speech = (rms > max(self.min_rms, self.noise * self.noise_ratio)) & (crossings >= self.zcr[0]) & (crossings <= self.zcr[1])
+
+        # Slow noise floor estimate on the quiet frames
+        for level in rms[~speech].tolist():
+            self.noise += 0.05 * (level - self.noise)
+
+        if self.vad is not None:
+            for i in np.flatnonzero(speech).tolist():
+                speech[i] = self.vad.predict(frames[i]) >= self.vad_threshold
+        return speech
+
+    def process(self, samples: np.ndarray) -> tuple[np.ndarray | None, bool]:
+        '''
+            Gate whole frames: the samples to score (with the pre-roll when the gate opens, None when closed)
+            and whether the gate just opened
+        '''
+        frames = samples.reshape(-1, self.frame)
+        self.frames += len(frames)
+        opening = False
+        passed = []
+        for frame, speech in zip(frames, self.speech(frames).tolist()):
+            if speech:
+                if not self.open:
+                    self.open = opening = True
+                    self.opened += 1
+                    passed.extend(self.preroll)
+                    self.preroll.clear()
+                self.remaining = self.hangover
+            elif self.open:
+                self.remaining -= 1
+                if self.remaining <= 0:
+                    self.open = False
+                    self.closed += 1
+
+            if self.open:
+                passed.append(frame)
+            else:
+                self.preroll.append(frame)
+
+        self.passed += len(passed)
+        return (np.concatenate(passed) if passed else None), opening
+
+    def stats(self) -> dict:
+        ''' Gate counters ("skipped": share of the frames not scored) '''
+        return {
+            "open": self.open,
+            "opened": self.opened,
+            "closed": self.closed,
+            "frames": self.frames,
+            "passed": self.passed,
+            "noise_rms": self.noise,
+            "skipped": 1 - self.passed / self.frames if self.frames else 0.0,
+        }
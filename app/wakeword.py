@@ -0,0 +1,110 @@
+import numpy as np
+import threading
+from collections import deque
+from time import monotonic, perf_counter
+from openwakeword.model import Model as WakeModel
+from app.vad import VoiceGate
+
+class WakeWord():
+    '''
+        Wake word detection thread, reading its own cursor of the capture ring.
+        The model is fed whole 80 ms frames (1280 samples at 16 kHz); when late, up to
+        "max_batch" frames are scored in one call (the best frame score is kept).
+        With a voice gate, only the speech-like segments are scored.
+    '''
+    frame = 1280
+
+    def __init__(self, audio, bus=None, models = ("hey_jarvis",), threshold = 0.8, patience = 2, refractory = 2.0, max_batch = 4, gate: VoiceGate | None = None) -> None:
+        self.audio = audio
+        self.bus = bus
+        self.model = WakeModel(wakeword_models=list(models))
+        self.threshold = threshold
+        self.patience = patience # Consecutive frames over the threshold
+        self.refractory = refractory # Seconds ignored after a detection
+        self.max_batch = max_batch
+        self.gate = gate
+
+        self.hits = 0
+        self.last_detection = -refractory
+        self.frames = 0
+        self.batches = 0
+        self.detections = 0
+        self.inference = deque(maxlen=256) # Seconds per frame
+
+        self.reader = audio.ring.reader("wakeword")
+        self.running = True
+        self.thread = threading.Thread(target=self.run, name="wakeword", daemon=True)
+        self.thread.start()
+
+    def score(self, samples: np.ndarray) -> float:
+        ''' Best score of the frames (several frames are scored in one call) '''
+        start = perf_counter()
+        prediction = self.model.predict(samples)
+        frames = len(samples) // self.frame
+        self.inference.append((perf_counter() - start) / frames)
+        self.frames += frames
+        self.batches += 1
+        return max(prediction.values(), default=0.0)
+
+    def detect(self, score: float) -> bool:
+        ''' Debounce (patience) and refractory period '''
+        now = monotonic()
+        if now - self.last_detection < self.refractory:
+            return False
+        self.hits = self.hits + 1 if score > self.threshold else 0
+        if self.hits < self.patience:
+            return False
+
+        self.hits = 0
+        self.last_detection = now
+        self.detections += 1
+        # Forget the model context, the same utterance must not trigger again
+        self.model.reset()
+        return True
+
+    def run(self) -> None:
+        ''' Detection thread '''
+        while self.running:
+            frames = min(max(self.reader.lag() // self.frame, 1), self.max_batch)
+            samples = self.reader.read(frames * self.frame, timeout=0.5)
+            if samples is None:
+                continue
+
+            if self.gate is not None:
+                samples, opening = self.gate.process(samples)
+                if samples is None:
+                    continue
+                if opening:
+                    # Don't mix the context of the previous segment
+                    self.model.reset()
+
+            if self.detect(self.score(samples)):
+                print("Wake word detected")
+                if self.bus:
+                    self.bus.emit("ai_wakeup")
+
+    def stats(self) -> dict:
+        ''' Inference time per frame (ms) and real-time factor '''
+        inference = np.array(self.inference) * 1000
+        frame_ms = self.frame / self.audio.rate * 1000
+        gate = {}
+        if self.gate is not None:
+            skipped = self.gate.frames - self.gate.passed
+            gate = {"gate": {**self.gate.stats(), "cpu_saved_ms": float(skipped * inference.mean()) if len(inference) else 0.0}}
+        return {
+            "frames": self.frames,
+            "batches": self.batches,
+            "detections": self.detections,
+            "lag": self.reader.lag(),
+            "dropped": self.reader.dropped,
+            "inference_ms": float(inference.mean()) if len(inference) else 0.0,
+            "inference_p95_ms": float(np.percentile(inference, 95)) if len(inference) else 0.0,
+            "rtf": float(inference.mean() / frame_ms) if len(inference) else 0.0,
+            **gate,
+        }
+
+    def close(self) -> None:
+        ''' Stop the detection thread '''
+        self.running = False
+        self.thread.join(timeout=1)
+        self.reader.close()
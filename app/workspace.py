@@ -0,0 +1,71 @@
+import hashlib
+import numpy as np
+from os import makedirs, path
+from scipy.ndimage import distance_transform_edt
+from app import world
+
+class Workspace():
+    '''
+        Voxel index of the positions the cone pivot can reach under the joints world limits.
+        Each voxel keeps the index of the nearest reachable one (projection).
+        No joint solution is stored: world.inverse_batch is closed-form (no iterative
+        solver to warm start) and solves a reachable position exactly.
+    '''
+    version = 2 # Cache format
+    def __init__(self, limits: np.ndarray, resolution = 20.0, cache: str | None = "app/data/workspace") -> None:
+        self.limits = np.asarray(limits, dtype=np.float64)
+        self.resolution = resolution # mm
+        self.reach = world.bras_horizontal + 2 * world.bras # mm
+        self.size = int(np.ceil(2 * self.reach / resolution)) + 1
+        self.origin = np.full(3, -self.reach)
+
+        file = None
+        if cache is not None:
+            file = path.join(cache, f"workspace-{self.key()}.npz")
+        if file is not None and path.exists(file):
+            data = np.load(file)
+            self.reachable, self.nearest_index = data["reachable"], data["nearest_index"]
+        else:
+            self.build()
+            if file is not None:
+                makedirs(cache, exist_ok=True) # type: ignore
+                np.savez_compressed(file, reachable=self.reachable, nearest_index=self.nearest_index)
+
+    def key(self) -> str:
+        ''' Hash of the geometry, limits and resolution (cache file name) '''
+        config = np.array([self.version, world.bras_horizontal, world.bras, world.correction_rad, self.resolution])
+        return hashlib.sha1(config.tobytes() + self.limits.tobytes()).hexdigest()[:16]
+
+    def build(self) -> None:
+        ''' Solve every voxel center, keep the reachable ones (inside the limits) '''
+        axis = self.origin[0] + np.arange(self.size) * self.resolution
+        centers = np.stack(np.meshgrid(axis, axis, axis, indexing="ij"), axis=-1).reshape(-1, 3)
+        _angles, valid = world.inverse_batch(centers, self.limits)
+
+        self.reachable = valid.reshape((self.size,) * 3)
+        if not self.reachable.any():
+            raise ValueError("Empty workspace (check the constraints)")
+        _distance, indices = distance_transform_edt(~self.reachable, return_indices=True) # type: ignore
+        self.nearest_index = indices.astype(np.int16)
+
+    def voxel(self, position: np.ndarray) -> tuple[tuple[int, int, int], bool]:
+        ''' Voxel of a position (clamped to the grid) and whether it is inside the grid '''
+        index = np.round((np.asarray(position, dtype=np.float64) - self.origin) / self.resolution).astype(int)
+        inside = bool(np.all((index >= 0) & (index < self.size)))
+        i, j, k = np.clip(index, 0, self.size - 1).tolist()
+        return (i, j, k), inside
+
+    def center(self, voxel: tuple[int, int, int]) -> np.ndarray:
+        return self.origin + np.array(voxel) * self.resolution
+
+    def contains(self, position: np.ndarray) -> bool:
+        ''' Whether a position is reachable (O(1)) '''
+        voxel, inside = self.voxel(position)
+        return inside and bool(self.reachable[voxel])
+
+    def nearest(self, position: np.ndarray) -> np.ndarray:
+        ''' The position itself when reachable, otherwise the center of the nearest reachable voxel '''
+        if self.contains(position):
+            return np.asarray(position, dtype=np.float64)
+        voxel, _inside = self.voxel(position)
+        return self.center(tuple(self.nearest_index[(slice(None), *voxel)].tolist()))
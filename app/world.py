@@ -9,87 +9,89 @@ bras_horizontal = 70  # mm
 bras = 320  # mm
 correction_rad = np.radians(95.36)
 
+# Columns of the batch angles, rows of the batch positions
+JOINTS = ("bras_horizontal", "bras1", "bras2", "cone")
+
  # Angles -> Positions (in mm)
+def direct_batch(angles: np.ndarray) -> np.ndarray:
+    ''' Convert (N, 4) world angles (deg, JOINTS order) to (N, 4, 3) pivots positions (in mm, from the pivot point 1) '''
+    angles = np.atleast_2d(np.asarray(angles, dtype=np.float64))
+    rad_m1 = np.radians(angles[:, 0])
+    angleM2Total = np.radians(-angles[:, 1]) + correction_rad
+    angleM3Total = angleM2Total + np.radians(-angles[:, 2])
+
+    # Arm plane (x, y), then rotation Y around M1 (z = 0 in the plane)
+    plane_x = np.empty((len(angles), 4))
+    plane_x[:, 0] = 0
+    plane_x[:, 1] = bras_horizontal
+    plane_x[:, 2] = plane_x[:, 1] + bras * np.cos(angleM2Total)
+    plane_x[:, 3] = plane_x[:, 2] + bras * np.cos(angleM3Total)
+
+    positions = np.empty((len(angles), 4, 3))
+    positions[:, :, 0] = np.cos(rad_m1)[:, None] * plane_x
+    positions[:, 0, 1] = 0
+    positions[:, 1, 1] = 0
+    positions[:, 2, 1] = bras * np.sin(angleM2Total)
+    positions[:, 3, 1] = positions[:, 2, 1] + bras * np.sin(angleM3Total)
+    positions[:, :, 2] = -np.sin(rad_m1)[:, None] * plane_x
+    return positions
+
 def direct(angles: dict[str, Angle]) -> dict:
     ''' Convert angles to position in the world (in mm, from the pivot point 1) '''
-    rad_m1 = np.radians(angles["bras_horizontal"].deg)
-    rad_m2 = np.radians(-angles["bras1"].deg)
-    rad_m3 = np.radians(-angles["bras2"].deg)
-
-    origin = np.array([0.0, 0.0, 0.0])
-    pivotM2 = origin + np.array([bras_horizontal, 0, 0])
-
-    angleM2Total = rad_m2 + correction_rad
-    pivotM3 = pivotM2 + np.array([
-        bras * np.cos(angleM2Total),
-        bras * np.sin(angleM2Total),
-        0
-    ])
-
-    angleM3Total = angleM2Total + rad_m3
-    pivotM4 = pivotM3 + np.array([
-        bras * np.cos(angleM3Total),
-        bras * np.sin(angleM3Total),
-        0
-    ])
+    batch = np.array([[angles[name].deg if name in angles else 0.0 for name in JOINTS]])
+    return {name: Position(x=x, y=y, z=z) for name, (x, y, z) in zip(JOINTS, direct_batch(batch)[0].tolist())}
 
-    # Rotation Y autour de M1
-    rot_y = np.array([
-        [np.cos(rad_m1), 0, np.sin(rad_m1)],
-        [0, 1, 0],
-        [-np.sin(rad_m1), 0, np.cos(rad_m1)]
-    ])
+def wrap(deg: np.ndarray) -> np.ndarray:
+    ''' Wrap angles to [-180, 180[ '''
+    return (deg + 180) % 360 - 180
 
-    m1 = rot_y @ origin
-    m2 = rot_y @ pivotM2
-    m3 = rot_y @ pivotM3
-    m4 = rot_y @ pivotM4
-
-    return {
-        "bras_horizontal": Position(x=m1[0], y=m1[1], z=m1[2]),
-        "bras1": Position(x=m2[0], y=m2[1], z=m2[2]),
-        "bras2": Position(x=m3[0], y=m3[1], z=m3[2]),
-        "cone": Position(x=m4[0], y=m4[1], z=m4[2])
-    }
+def within(angles: np.ndarray, limits: np.ndarray | None) -> np.ndarray:
+    ''' Mask of the rows inside the (4, 2) world limits (bounds excluded) '''
+    if limits is None:
+        return np.ones(len(angles), dtype=bool)
+    return np.all((angles > limits[:, 0]) & (angles < limits[:, 1]), axis=1)
 
 # Generated by ChatGPT from direct function.
 # Position of M4 Pivot (mm) -> Angles
-def inverse(position: Position) -> dict[str, Angle]:
-    ''' Convert position (in mm, from the pivot point 1) to angles in the world '''
-
-    pos = np.array([position.x, position.y, position.z])
-    m1_rad = np.arctan2(pos[2], pos[0])
-    horizontal_distance = np.sqrt(pos[0]**2 + pos[2]**2)
-    local_target = np.array([horizontal_distance - bras_horizontal, pos[1]])
-    d = np.linalg.norm(local_target)
-
-    if d > (2 * bras + 200):
-        raise ValueError("Unable to join position.")
-
-    angle_to_target = np.arctan2(local_target[1], local_target[0])
-    cos_m3 = (d**2 - 2 * bras**2) / (2 * bras**2)
-    cos_m3 = np.clip(cos_m3, -1, 1)
-    m3_base = np.arccos(cos_m3)
-
-    def try_solution(elbow_up: bool):
-        alpha = np.arccos(np.clip((d**2 + bras**2 - bras**2) / (2 * d * bras), -1, 1))
+def inverse_batch(positions: np.ndarray, limits: np.ndarray | None = None) -> tuple[np.ndarray, np.ndarray]:
+    '''
+        Convert (N, 3) positions (in mm, from the pivot point 1) to (N, 4) world angles (deg, JOINTS order)
+        and a mask of the valid rows. The elbow down solution is used, the elbow up one when the first
+        is outside the (4, 2) world limits (min, max per joint); rows with no solution are not valid.
+    '''
+    pos = np.atleast_2d(np.asarray(positions, dtype=np.float64))
+    m1_rad = np.arctan2(-pos[:, 2], pos[:, 0])
+    horizontal_distance = np.hypot(pos[:, 0], pos[:, 2])
+    local_x = horizontal_distance - bras_horizontal
+    local_y = pos[:, 1]
+    d = np.hypot(local_x, local_y)
+
+    angle_to_target = np.arctan2(local_y, local_x)
+    m3_base = np.arccos(np.clip((d**2 - 2 * bras**2) / (2 * bras**2), -1, 1))
+    alpha = np.arccos(np.clip(d / (2 * bras), -1, 1))
+
+    def solution(elbow_up: bool) -> np.ndarray:
         m2 = angle_to_target + alpha if elbow_up else angle_to_target - alpha
         m3 = -m3_base if elbow_up else m3_base
+        angles = np.zeros((len(pos), 4))
+        angles[:, 0] = np.degrees(m1_rad)
+        angles[:, 1] = wrap(-np.degrees(m2 - correction_rad))
+        angles[:, 2] = wrap(-np.degrees(m3))
+        return angles
+
+    reachable = d <= 2 * bras
+    down = solution(elbow_up=False)
+    down_valid = within(down, limits)
+    if down_valid.all():
+        return down, reachable
+
+    up = solution(elbow_up=True)
+    angles = np.where(down_valid[:, None], down, up)
+    return angles, reachable & (down_valid | within(up, limits))
 
-        m1_deg = np.degrees(m1_rad)
-        m2_deg = -np.degrees(m2 - correction_rad)
-        m3_deg = -np.degrees(m3)
-
-        #TODO: We probably need to check constraint here
-        return {
-            "bras_horizontal": Angle(deg=m1_deg),
-            "bras1": Angle(deg=m2_deg),
-            "bras2": Angle(deg=m3_deg),
-            "cone": Angle(deg=0)
-        }
-
-    result = try_solution(elbow_up=False) or try_solution(elbow_up=True)
-    if not result:
-        raise ValueError("No solution.")
-
-    return result
+def inverse(position: Position) -> dict[str, Angle]:
+    ''' Convert position (in mm, from the pivot point 1) to angles in the world '''
+    angles, valid = inverse_batch(np.array([[position.x, position.y, position.z]]))
+    if not valid[0]:
+        raise ValueError("Unable to join position.")
+    return {name: Angle(deg=deg) for name, deg in zip(JOINTS, angles[0].tolist())}
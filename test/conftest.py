@@ -0,0 +1,70 @@
+import os
+import sys
+import types
+
+# Tests import the service modules as "app.*" from the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    import STservo_sdk
+except ImportError:
+    # Without the servo SDK, the tests use fake hardware (see FakeSyncRead and FakeHandler)
+    sdk = types.ModuleType("STservo_sdk")
+    sdk.COMM_SUCCESS = 0
+    sdk.STS_TORQUE_ENABLE = 40
+    sdk.STS_PRESENT_POSITION_L = 56
+    sdk.STS_PRESENT_SPEED_L = 58
+    sdk.STS_PRESENT_LOAD_L = 60
+    sdk.STS_PRESENT_VOLTAGE = 62
+    sdk.STS_PRESENT_TEMPERATURE = 63
+    sdk.sts = sdk.PortHandler = sdk.GroupSyncRead = object
+    sys.modules["STservo_sdk"] = sdk
+
+import time
+import pytest
+from app.models import Angle, Constraint
+from app.motor import Motor
+from app.scheduler import SerialScheduler
+
+class FakeState():
+    def __init__(self, deg: float) -> None:
+        self.deg = deg
+
+class FakeTrajectory():
+    def stop(self) -> None:
+        pass
+
+class FakeController():
+    '''
+        Controller without a serial bus: the goals go through a real serial scheduler,
+        every commanded world angles are recorded
+    '''
+    def __init__(self) -> None:
+        self.motors: dict[str, Motor] = {}
+        self.telemetry: dict[str, FakeState] = {}
+        self.scheduler = SerialScheduler(name="fake")
+        self.trajectory = FakeTrajectory()
+        self.commands: list[dict[str, float]] = []
+        self.written: list[dict] = []
+        self.delay = 0.0 # Blocking time of the next move (seconds)
+
+    def add_motor(self, name: str, deg: float, constraint: Constraint, offset = 0.0, is_reverse = False, speed = 3000) -> None:
+        self.motors[name] = Motor(None, len(self.motors) + 1, name, constraint, Angle(deg=offset), is_reverse, speed=speed) # type: ignore
+        self.telemetry[name] = FakeState(deg)
+
+    def motor(self, name: str) -> Motor:
+        return self.motors[name]
+
+    def move_degrees(self, degrees: dict[str, float]):
+        goals = {name: (self.motor(name).encode_world_deg(deg), 0, 0) for name, deg in degrees.items()}
+        self.commands.append(dict(degrees))
+        if self.delay:
+            time.sleep(self.delay)
+            self.delay = 0.0
+        return self.scheduler.submit_goals(goals, self.written.append)
+
+@pytest.fixture
+def fake_controller():
+    controller = FakeController()
+    yield controller
+    controller.scheduler.close()
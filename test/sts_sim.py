@@ -252,6 +252,18 @@ def parse_command(data, servos):
             s.apply_reg_write()
         return None
     
+    elif cmd == 0x82: # SYNC_READ
+        if len(params) < 3:
+            return build_status_packet(254, 0x10, [])
+
+        addr, size = params[0], params[1]
+        # Each servo answers with its own status packet, in the requested order
+        resp = b""
+        for servo_id in params[2:]:
+            if servo_id in servos:
+                resp += build_status_packet(servo_id, 0, servos[servo_id].read_register(addr, size))
+        return resp or None
+
     elif cmd == 0x83: # SYNC_WRITE
         if len(params) < 3:
             return build_status_packet(254, 0x10, [])
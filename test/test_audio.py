@@ -0,0 +1,27 @@
+import io
+import wave
+import pytest
+
+pytest.importorskip("pyaudio")
+
+from app.audio import MAX_RECORD, Audio
+
+def audio(rate = 16000) -> Audio:
+    ''' Audio without devices (only the WAV helpers are used) '''
+    device = Audio.__new__(Audio)
+    device.rate = rate
+    return device
+
+def test_wav_header():
+    device = audio()
+    samples = device.record_samples(0.5)
+    data = device.wav_header(samples) + bytes(samples * 2)
+    assert len(data) == device.record_size(0.5)
+    with wave.open(io.BytesIO(data)) as wav:
+        assert wav.getframerate() == 16000
+        assert wav.getnframes() == 8000
+
+@pytest.mark.parametrize("duration", [0, -1, MAX_RECORD + 1])
+def test_invalid_duration(duration):
+    with pytest.raises(ValueError):
+        audio().record_size(duration)
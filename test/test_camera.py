@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+
+cv2 = pytest.importorskip("cv2")
+
+from app import camera as camera_module
+from app.camera import Camera
+
+class FakeCapture():
+    ''' Writes the frame number in the given buffer, like VideoCapture.read(image) '''
+    def __init__(self, device) -> None:
+        self.count = 0
+
+    def isOpened(self) -> bool:
+        return True
+
+    def read(self, image=None):
+        self.count += 1
+        if image is None:
+            image = np.zeros((4, 4, 3), dtype=np.uint8)
+        image[:] = self.count % 256
+        return True, image
+
+    def release(self) -> None:
+        pass
+
+def test_held_frames_are_not_overwritten(monkeypatch):
+    monkeypatch.setattr(camera_module.cv2, "VideoCapture", FakeCapture)
+    camera = Camera(buffers=3)
+    try:
+        held = [camera.wait(0, timeout=1)]
+        for _ in range(2):
+            held.append(camera.wait(held[-1].id, timeout=1))
+        values = [int(frame.image[0, 0, 0]) for frame in held]
+
+        # Let the capture run many laps while the frames are held
+        camera.wait(held[-1].id + 50, timeout=1)
+        assert [int(frame.image[0, 0, 0]) for frame in held] == values
+        assert camera.allocations > 0
+    finally:
+        camera.close()
@@ -0,0 +1,101 @@
+import asyncio
+import math
+import pytest
+from app import controller as controller_module
+from app.controller import Controller
+from app.models import Angle, Constraint
+
+class FakePort():
+    def __init__(self, device) -> None:
+        self.is_open = True
+
+    def setBaudRate(self, baudrate) -> None:
+        pass
+
+    def openPort(self) -> bool:
+        return True
+
+    def closePort(self) -> None:
+        self.is_open = False
+
+class FakeHandler():
+    def __init__(self, port) -> None:
+        self.portHandler = port
+
+    def sts_tohost(self, value: int, bit: int) -> int:
+        return -(value & ~(1 << bit)) if value & (1 << bit) else value
+
+    def write1ByteTxRx(self, sts_id, address, value):
+        return 0, 0
+
+class FakeSyncRead():
+    ''' Present state block of each motor id (None: no answer) '''
+    state: dict[int, dict[int, int] | None] = {}
+
+    def __init__(self, handler, start, length) -> None:
+        self.ids = []
+
+    def addParam(self, sts_id) -> bool:
+        self.ids.append(sts_id)
+        return True
+
+    def txRxPacket(self) -> int:
+        return 0
+
+    def isAvailable(self, sts_id, address, length):
+        return FakeSyncRead.state.get(sts_id) is not None, 0
+
+    def getData(self, sts_id, address, length) -> int:
+        return FakeSyncRead.state[sts_id][address] # type: ignore
+
+def block(position: int, speed = 0, load = 0, voltage = 120, temperature = 30) -> dict[int, int]:
+    return {56: position, 58: speed, 60: load, 62: voltage, 63: temperature}
+
+@pytest.fixture
+def controller(monkeypatch):
+    monkeypatch.setattr(controller_module, "PortHandler", FakePort)
+    monkeypatch.setattr(controller_module, "sts", FakeHandler)
+    monkeypatch.setattr(controller_module, "GroupSyncRead", FakeSyncRead)
+    controller = Controller(bus=None)
+    controller.add_motor("bras1", 1, Angle(deg=0), Constraint(min=-180, max=180))
+    controller.add_motor("bras2", 2, Angle(deg=10), Constraint(min=-180, max=180), is_reverse=True)
+    controller.add_motor("cone", 3, Angle(deg=0), Constraint(min=-180, max=180))
+    yield controller
+    controller.close()
+
+def test_read_encoded(controller):
+    FakeSyncRead.state = {1: block(1024, speed=(1 << 15) | 20, load=(1 << 10) | 5), 2: block(4095), 3: None}
+    state = controller.read_encoded()
+    assert state[0].tolist() == [1024, -20, -5, 120, 30]
+    assert state[1, 0] == 4095
+    assert state[2, 0] == -1
+
+def test_world_angles(controller):
+    angles = controller.world_angles(controller_module.np.array([1024, 4095, -1]))
+    assert angles[0] == pytest.approx(90)
+    # Reversed with an offset: outside ±360°
+    assert angles[1] == pytest.approx(-4095 * 360 / 4096 - 10)
+    assert math.isnan(angles[2])
+
+def test_read_world_reversed_motor_out_of_range(controller):
+    FakeSyncRead.state = {1: block(1024), 2: block(4095), 3: None}
+    angles = controller.read_world()
+    assert set(angles) == {"bras1", "bras2"}
+    assert angles["bras2"].deg == pytest.approx(-369.9, abs=0.1)
+    assert controller.telemetry["bras2"].voltage == pytest.approx(12.0)
+    assert "cone" not in controller.telemetry
+
+def test_state(controller):
+    FakeSyncRead.state = {1: block(2048), 2: block(0), 3: None}
+
+    async def main():
+        state = await controller.state("bras1")
+        assert state.deg == pytest.approx(180)
+        # Cached: not read again while fresh enough
+        FakeSyncRead.state[1] = block(1024)
+        assert (await controller.state("bras1", max_age=10)).deg == pytest.approx(180)
+        assert (await controller.state("bras1", max_age=0)).deg == pytest.approx(90)
+        with pytest.raises(controller_module.ControllerExeption):
+            await controller.state("cone")
+
+    asyncio.run(main())
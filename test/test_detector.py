@@ -0,0 +1,24 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("cv2")
+
+from app.detector import Detector, create_detector
+
+def test_incomplete_backend_fails_on_construction():
+    class Blind(Detector):
+        pass
+
+    with pytest.raises(TypeError):
+        Blind()
+
+def test_detect_offsets_the_region():
+    class Fixed(Detector):
+        def faces(self, image) -> list:
+            return [(1, 2, 3, 4)]
+
+    assert Fixed().detect(np.zeros((10, 10)), roi=(5, 6, 4, 4)) == [(6, 8, 3, 4)]
+
+def test_unknown_backend():
+    with pytest.raises(ValueError):
+        create_detector("nope")
@@ -0,0 +1,197 @@
+import asyncio
+import math
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from app.eventbus import EventBus, Offload, Policy
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+async def settle():
+    ''' Let the workers deliver the queued events '''
+    for _ in range(10):
+        await asyncio.sleep(0)
+
+def test_delivery_and_counters():
+    async def main():
+        bus = EventBus()
+        received = []
+        bus.subscribe("event")(lambda value: received.append(value))
+        assert bus.emit("event", 1)
+        assert bus.emit("event", 2)
+        await settle()
+        assert received == [1, 2]
+        stats = bus.stats()["event"]
+        assert stats["emitted"] == 2 and stats["delivered"] == 2 and stats["depth"] == 0
+        bus.close()
+    run(main())
+
+def test_drop_oldest():
+    async def main():
+        bus = EventBus()
+        bus.configure("event", maxsize=2, policy=Policy.DROP_OLDEST)
+        received = []
+        bus.subscribe("event")(lambda value: received.append(value))
+        for value in range(5):
+            assert bus.emit("event", value)
+        await settle()
+        assert received == [3, 4]
+        assert bus.stats()["event"]["dropped"] == 3
+        bus.close()
+    run(main())
+
+def test_latest_keeps_only_the_newest():
+    async def main():
+        bus = EventBus()
+        bus.configure("event", maxsize=8, policy=Policy.LATEST)
+        received = []
+        bus.subscribe("event")(lambda value: received.append(value))
+        for value in range(5):
+            bus.emit("event", value)
+        await settle()
+        assert received == [4]
+        assert bus.stats()["event"]["coalesced"] == 4
+        bus.close()
+    run(main())
+
+def test_reject_when_full():
+    async def main():
+        bus = EventBus()
+        bus.configure("event", maxsize=1, policy=Policy.REJECT)
+        received = []
+        bus.subscribe("event")(lambda value: received.append(value))
+        assert bus.emit("event", 1)
+        assert not bus.emit("event", 2)
+        await settle()
+        assert received == [1]
+        assert bus.stats()["event"]["rejected"] == 1
+        bus.close()
+    run(main())
+
+def test_block_publish_waits_for_room():
+    async def main():
+        bus = EventBus()
+        bus.configure("event", maxsize=1, policy=Policy.BLOCK)
+        release = asyncio.Event()
+        received = []
+
+        async def slow(value):
+            await release.wait()
+            received.append(value)
+
+        bus.subscribe("event")(slow)
+        await bus.publish("event", 1)
+        await asyncio.sleep(0) # Taken by the worker, now waiting
+        await bus.publish("event", 2) # Fills the queue
+        third = asyncio.ensure_future(bus.publish("event", 3))
+        await asyncio.sleep(0.01)
+        assert not third.done()
+        # emit can't wait on a full BLOCK topic
+        assert not bus.emit("event", 4)
+
+        release.set()
+        await third
+        await settle()
+        assert received == [1, 2, 3]
+        bus.close()
+    run(main())
+
+def test_request_gathers_results_and_errors():
+    async def main():
+        bus = EventBus()
+        bus.subscribe("event")(lambda value: value * 2)
+
+        async def failing(value):
+            raise ValueError(value)
+
+        bus.subscribe("event")(failing)
+        results = await bus.request("event", 21)
+        assert results[0] == 42
+        assert isinstance(results[1], ValueError)
+        assert bus.stats()["event"]["failed"] == 1
+        bus.close()
+    run(main())
+
+def test_emit_from_a_thread():
+    async def main():
+        bus = EventBus()
+        received = []
+        bus.subscribe("event")(lambda value: received.append((value, threading.current_thread() is threading.main_thread())))
+        bus.emit("event", "loop") # Starts the worker (records the loop)
+        await settle()
+        await asyncio.to_thread(bus.emit, "event", "thread")
+        await settle()
+        assert received == [("loop", True), ("thread", True)]
+        bus.close()
+    run(main())
+
+def test_emit_from_a_thread_after_bind():
+    async def main():
+        bus = EventBus()
+        received = []
+        bus.subscribe("event")(received.append)
+        assert not await asyncio.to_thread(bus.emit, "event", "unbound")
+        bus.bind()
+        assert await asyncio.to_thread(bus.emit, "event", "bound")
+        await settle()
+        assert received == ["bound"]
+        bus.close()
+    run(main())
+
+def test_offload_to_an_executor():
+    async def main():
+        bus = EventBus()
+        executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="custom")
+        bus.subscribe("event", offload=executor)(lambda: threading.current_thread().name)
+        bus.subscribe("other", offload=Offload.THREAD)(lambda: threading.current_thread().name)
+        names = await bus.request("event") + await bus.request("other")
+        assert names[0].startswith("custom")
+        assert names[1].startswith("bus")
+        bus.close()
+        executor.shutdown()
+    run(main())
+
+def test_offload_to_a_spawned_process():
+    async def main():
+        bus = EventBus()
+        bus.subscribe("event", offload=Offload.PROCESS)(math.sqrt)
+        assert await bus.request("event", 16.0) == [4.0]
+        assert bus.executor(Offload.PROCESS)._mp_context.get_start_method() == "spawn" # type: ignore
+        bus.close()
+    run(main())
+
+def test_unsubscribe():
+    async def main():
+        bus = EventBus()
+        received = []
+        listener = bus.subscribe("event")(lambda value: received.append(value))
+        bus.emit("event", 1)
+        await settle()
+        bus.unsubscribe("event", listener)
+        bus.emit("event", 2)
+        await settle()
+        assert received == [1]
+        bus.close()
+    run(main())
+
+def test_base_exception_listener_keeps_the_worker():
+    class DeviceError(BaseException):
+        pass
+
+    async def main():
+        bus = EventBus()
+        calls = []
+
+        def listener(value):
+            calls.append(value)
+            if value == 1:
+                raise DeviceError("no answer")
+            return value
+
+        bus.subscribe("event")(listener)
+        results = await asyncio.wait_for(bus.request("event", 1), 1)
+        assert isinstance(results[0], DeviceError)
+        assert await asyncio.wait_for(bus.request("event", 2), 1) == [2]
+        assert bus.stats()["event"]["failed"] == 1
+        bus.close()
+    run(main())
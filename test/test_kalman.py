@@ -0,0 +1,39 @@
+import numpy as np
+from app.kalman import KalmanTarget
+
+def test_first_measurement_initializes():
+    target = KalmanTarget()
+    target.update(1.0, 0.2, -0.3)
+    assert target.position() == (0.2, -0.3)
+    assert target.velocity() == (0.0, 0.0)
+
+def test_tracks_constant_velocity():
+    target = KalmanTarget()
+    for i in range(40):
+        t = i * 0.1
+        target.update(t, 0.5 * t - 0.5, -0.2 * t)
+    vx, vy = target.velocity()
+    assert abs(vx - 0.5) < 0.02 and abs(vy + 0.2) < 0.02
+
+    # Extrapolated ahead of the last measurement
+    x, y = target.position(horizon=0.2)
+    t = 3.9 + 0.2
+    assert abs(x - (0.5 * t - 0.5)) < 0.01 and abs(y + 0.2 * t) < 0.01
+
+def test_smooths_noise():
+    rng = np.random.default_rng(0)
+    target = KalmanTarget()
+    errors = []
+    for i in range(100):
+        target.update(i * 0.1, 0.3 + rng.normal(0, 0.05), 0.0)
+        errors.append(abs(target.position()[0] - 0.3))
+    assert np.mean(errors[50:]) < 0.03
+
+def test_reset_forgets():
+    target = KalmanTarget()
+    target.update(0.0, 0.0, 0.0)
+    target.update(0.1, 0.1, 0.0)
+    target.reset()
+    target.update(5.0, -0.4, 0.4)
+    assert target.position() == (-0.4, 0.4)
+    assert target.velocity() == (0.0, 0.0)
@@ -0,0 +1,53 @@
+import numpy as np
+import threading
+from app.ringbuffer import PcmRing
+
+def samples(start: int, count: int) -> np.ndarray:
+    return np.arange(start, start + count, dtype=np.int16)
+
+def test_independent_readers():
+    ring = PcmRing(100)
+    first = ring.reader("first")
+    ring.write(samples(0, 30))
+    second = ring.reader("second")
+    ring.write(samples(30, 30))
+
+    assert first.read(40, timeout=0).tolist() == list(range(40))
+    assert second.read(30, timeout=0).tolist() == list(range(30, 60))
+    assert first.lag() == 20 and second.lag() == 0
+
+def test_wraps_around():
+    ring = PcmRing(10)
+    reader = ring.reader("reader")
+    for start in range(0, 40, 7):
+        ring.write(samples(start, 7))
+        assert reader.read(7, timeout=0).tolist() == list(range(start, start + 7))
+    assert reader.dropped == 0
+
+def test_overrun_skips_ahead_and_counts():
+    ring = PcmRing(10)
+    reader = ring.reader("reader")
+    ring.write(samples(0, 25))
+    assert reader.read(5, timeout=0).tolist() == list(range(15, 20))
+    assert reader.dropped == 15
+    assert ring.stats()["readers"]["reader"] == {"lag": 5, "dropped": 15}
+
+def test_history():
+    ring = PcmRing(10)
+    ring.write(samples(0, 8))
+    assert ring.reader("late", history=3).read(3, timeout=0).tolist() == [5, 6, 7]
+
+def test_read_timeout_and_wake_up():
+    ring = PcmRing(100)
+    reader = ring.reader("reader")
+    assert reader.read(10, timeout=0.01) is None
+
+    writer = threading.Timer(0.05, lambda: ring.write(samples(0, 10)))
+    writer.start()
+    assert reader.read(10, timeout=1).tolist() == list(range(10))
+    writer.join()
+
+def test_close():
+    ring = PcmRing(10)
+    ring.reader("reader").close()
+    assert ring.stats()["readers"] == {}
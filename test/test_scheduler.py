@@ -0,0 +1,72 @@
+import threading
+import pytest
+from app.scheduler import Priority, SerialScheduler
+
+@pytest.fixture
+def scheduler():
+    scheduler = SerialScheduler(name="test")
+    yield scheduler
+    scheduler.close()
+
+def hold(scheduler: SerialScheduler) -> threading.Event:
+    ''' Keep the serial thread busy until the returned event is set '''
+    release = threading.Event()
+    started = threading.Event()
+    def busy():
+        started.set()
+        release.wait(1)
+    scheduler.submit(Priority.TELEMETRY, busy)
+    started.wait(1)
+    return release
+
+def test_result_and_exception(scheduler):
+    assert scheduler.submit(Priority.TELEMETRY, lambda a, b: a + b, 1, 2).result(1) == 3
+
+    def failing():
+        raise ValueError("bus")
+    with pytest.raises(ValueError):
+        scheduler.submit(Priority.MOTION, failing).result(1)
+    assert scheduler.stats()["failed"] == 1
+
+def test_priority_order(scheduler):
+    release = hold(scheduler)
+    order = []
+    futures = [
+        scheduler.submit(Priority.TELEMETRY, order.append, "telemetry"),
+        scheduler.submit(Priority.MOTION, order.append, "motion"),
+        scheduler.submit(Priority.EMERGENCY, order.append, "emergency"),
+    ]
+    release.set()
+    for future in futures:
+        future.result(1)
+    assert order == ["emergency", "motion", "telemetry"]
+
+def test_goals_are_coalesced(scheduler):
+    release = hold(scheduler)
+    flushed = []
+    first = scheduler.submit_goals({"bras1": 1, "bras2": 1}, flushed.append)
+    second = scheduler.submit_goals({"bras1": 2}, flushed.append)
+    release.set()
+
+    first.result(1)
+    second.result(1)
+    # One transaction with the newest goal of each joint
+    assert flushed == [{"bras1": 2, "bras2": 1}]
+    assert scheduler.stats()["coalesced"] == 1
+
+def test_goals_failure_reaches_every_future(scheduler):
+    release = hold(scheduler)
+    def flush(goals):
+        raise IOError("no answer")
+    futures = [scheduler.submit_goals({"bras1": 1}, flush), scheduler.submit_goals({"bras2": 1}, flush)]
+    release.set()
+    for future in futures:
+        with pytest.raises(IOError):
+            future.result(1)
+
+def test_stats(scheduler):
+    scheduler.submit(Priority.TELEMETRY, lambda: None).result(1)
+    stats = scheduler.stats()
+    assert stats["transactions"] == 1
+    assert stats["depth"] == 0
+    assert stats["latency_max_ms"] >= stats["latency_ms"] >= 0
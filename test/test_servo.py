@@ -0,0 +1,34 @@
+import asyncio
+import numpy as np
+from app.models import Constraint, Point, TrackingTarget
+from app.servo import VisualServo
+
+def test_servo_respects_world_limits_and_counts_overruns(fake_controller):
+    controller = fake_controller
+    controller.add_motor("bras_horizontal", 0.0, Constraint(min=-20, max=20), offset=5.0, is_reverse=True)
+    controller.add_motor("bras1", 0.0, Constraint(min=-10, max=10))
+    controller.add_motor("bras2", 0.0, Constraint(min=-10, max=10))
+    controller.delay = 0.1 # First move blocks three periods
+
+    async def track():
+        servo = VisualServo(controller, rate=30, timeout=0.8)
+        loop = asyncio.get_running_loop()
+        # Target in the corner: far outside the limits of the pan and of bras2
+        servo.update(TrackingTarget(Point(1.0, -1.0), 0.0, 0.0, loop.time(), 0.0))
+        await asyncio.wait_for(servo.task, 3) # type: ignore
+        return servo
+
+    servo = asyncio.run(track())
+    assert controller.motor("bras_horizontal").world_limits() == (-15.0, 25.0)
+    pan = np.array([command["bras_horizontal"] for command in controller.commands])
+    bras1 = np.array([command["bras1"] for command in controller.commands])
+    bras2 = np.array([command["bras2"] for command in controller.commands])
+    assert pan.max() == 24.5 and pan.min() >= 0
+    assert bras2.min() == -9.5
+    # Inside the limits, the goal is reached
+    assert np.isclose(bras1[-1], -0.3 * 24, atol=0.5)
+
+    stats = servo.stats()
+    assert stats["overruns"] >= 1
+    assert stats["max_lateness_ms"] > 1000 / 30
+    assert stats["loops"] == len(controller.commands)
@@ -0,0 +1,31 @@
+import numpy as np
+import pytest
+
+from app import speech
+from app.speech import Speech, SpeechEngine, resample, sentences
+
+def test_missing_engine_disables_speech(monkeypatch):
+    monkeypatch.setattr(speech.shutil, "which", lambda binary: None)
+    subscribed = []
+    class Bus():
+        def subscribe(self, event, **kwargs):
+            subscribed.append(event)
+            return lambda listener: listener
+
+    talk = Speech(audio=None, bus=Bus())
+    assert talk.engine is None
+    assert subscribed == []
+    assert talk.stats()["enabled"] is False
+
+def test_incomplete_engine_fails_on_construction():
+    class Silent(SpeechEngine):
+        pass
+
+    with pytest.raises(TypeError):
+        Silent()
+
+def test_sentences():
+    assert sentences("Bonjour ! Je suis la lampe. Que veux-tu ?\nOk") == ["Bonjour !", "Je suis la lampe.", "Que veux-tu ?", "Ok"]
+
+def test_resample():
+    assert len(resample(np.zeros(22050, dtype=np.int16), 22050, 16000)) == 16000
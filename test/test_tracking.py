@@ -0,0 +1,36 @@
+import numpy as np
+import pytest
+
+cv2 = pytest.importorskip("cv2")
+pytest.importorskip("pydantic")
+
+from app.tracking import Tracking
+
+def test_construction():
+    tracking = Tracking(bus=None)
+    assert tracking.scaled_min_size() == 100
+    assert tracking.search_window(320, 240) is None
+    tracking.close()
+
+def test_face_tracking_without_face():
+    tracking = Tracking(bus=None)
+    frame = np.zeros((240, 320, 3), dtype=np.uint8)
+    assert tracking.face_tracking(frame) is None
+    assert tracking.misses == 1
+
+def test_search_window_follows_the_face():
+    tracking = Tracking(bus=None)
+    tracking.face = (100, 80, 60, 60)
+    tracking.face_velocity = (10.0, 0.0)
+    x, y, w, h = tracking.search_window(320, 240)
+    # Shifted by the velocity, larger than the face
+    assert x + w / 2 > 130
+    assert w > 60 and h > 60
+
+def test_invalid_object_falls_back_to_faces():
+    from app.models import TrackingModeEnum, TrackingSubjects
+    tracking = Tracking(bus=None)
+    tracking.on_change_tracking_mode(TrackingModeEnum.OBJECT, TrackingSubjects(bbox=[0.1, 0.2], name="cup", confidence=0.9))
+    tracking.apply_tracking_mode()
+    assert tracking.tracking_mode == TrackingModeEnum.FACE
+    assert tracking.subject is None
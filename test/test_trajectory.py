@@ -0,0 +1,60 @@
+import asyncio
+import numpy as np
+import pytest
+from app.models import Angle, Constraint
+from app.motor import MotorExeption
+from app.trajectory import Trajectory
+
+@pytest.fixture
+def controller(fake_controller):
+    fake_controller.add_motor("bras1", 0.0, Constraint(min=-90, max=90))
+    fake_controller.add_motor("bras2", 10.0, Constraint(min=-90, max=90), offset=5.0, is_reverse=True)
+    return fake_controller
+
+def test_joint_move_ends_at_target(controller):
+    async def move():
+        trajectory = Trajectory(controller, rate=50)
+        trajectory.move_joints({"bras1": Angle(deg=30)})
+        await asyncio.wait_for(trajectory.task, 2) # type: ignore
+        return trajectory
+
+    trajectory = asyncio.run(move())
+    assert trajectory.segment is None
+    assert controller.commands[-1] == {"bras1": 30.0, "bras2": 10.0}
+    # Smooth start from the telemetry, the other joint keeps its angle
+    assert abs(controller.commands[0]["bras1"]) < 5
+    assert all(command["bras2"] == 10.0 for command in controller.commands)
+    assert len(controller.commands) > 5
+    controller.scheduler.submit_goals({}, lambda goals: None).result(1)
+    assert controller.written
+
+def test_newer_goal_preempts_without_jump(controller):
+    async def move():
+        trajectory = Trajectory(controller, rate=50)
+        trajectory.move_joints({"bras1": Angle(deg=60)})
+        await asyncio.sleep(0.1)
+        running = trajectory.segment
+        task = trajectory.task
+        expected = running.sample(trajectory.now() - trajectory.start)[0] # type: ignore
+        trajectory.move_joints({"bras1": Angle(deg=-30)})
+        # Same streaming task, the new segment starts where the running one is
+        assert trajectory.task is task
+        assert np.allclose(trajectory.segment.c[0], expected, atol=0.5) # type: ignore
+        await asyncio.wait_for(task, 2) # type: ignore
+
+    asyncio.run(move())
+    bras1 = np.array([command["bras1"] for command in controller.commands])
+    assert 0 < bras1.max() < 60
+    assert bras1[-1] == -30.0
+    assert np.abs(np.diff(bras1)).max() < 15
+
+def test_out_of_limits_goal_rejected_before_moving(controller):
+    async def move():
+        trajectory = Trajectory(controller, rate=50)
+        with pytest.raises(MotorExeption):
+            trajectory.move_joints({"bras1": Angle(deg=120)})
+        return trajectory
+
+    trajectory = asyncio.run(move())
+    assert trajectory.task is None
+    assert controller.commands == []
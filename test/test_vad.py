@@ -0,0 +1,41 @@
+import numpy as np
+from app.vad import VoiceGate
+
+FRAME = 1280
+
+def silence(frames: int, seed = 0) -> np.ndarray:
+    return np.random.default_rng(seed).normal(0, 30, frames * FRAME).astype(np.int16)
+
+def voice(frames: int) -> np.ndarray:
+    t = np.arange(frames * FRAME) / 16000
+    return (3000 * np.sin(2 * np.pi * 200 * t)).astype(np.int16)
+
+def test_silence_is_gated():
+    gate = VoiceGate()
+    samples, opening = gate.process(silence(20))
+    assert samples is None and not opening
+    assert gate.stats()["skipped"] == 1.0
+
+def test_voice_opens_with_preroll():
+    gate = VoiceGate(preroll=0.24) # 3 frames
+    gate.process(silence(10))
+    samples, opening = gate.process(voice(5))
+    assert opening
+    assert len(samples) == (3 + 5) * FRAME
+    assert gate.stats()["opened"] == 1
+
+def test_hangover_then_close():
+    gate = VoiceGate(hangover=0.4, preroll=0) # 5 frames
+    gate.process(voice(2))
+    samples, opening = gate.process(silence(10))
+    assert not opening
+    # The last hangover frame closes the gate
+    assert len(samples) == 4 * FRAME
+    stats = gate.stats()
+    assert stats["closed"] == 1 and not stats["open"]
+
+def test_noise_like_frames_are_not_speech():
+    # Loud white noise: energy is there but the zero-crossing rate is too high
+    gate = VoiceGate()
+    noise = np.random.default_rng(1).normal(0, 3000, 5 * FRAME).clip(-32768, 32767).astype(np.int16)
+    assert not gate.speech(noise.reshape(-1, FRAME)).any()
@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("scipy")
+
+from app import world
+from app.workspace import Workspace
+
+LIMITS = np.array([[-90.0, 90.0], [-60.0, 60.0], [-150.0, 150.0], [-np.inf, np.inf]])
+
+@pytest.fixture
+def workspace(tmp_path):
+    return Workspace(LIMITS, resolution=40.0, cache=str(tmp_path))
+
+def test_contains(workspace):
+    inside = world.direct_batch(np.array([[10.0, 20.0, 90.0, 0.0]]))[0, 3]
+    assert workspace.contains(inside)
+    assert not workspace.contains(np.array([2000.0, 0.0, 0.0]))
+
+def test_nearest(workspace):
+    inside = world.direct_batch(np.array([[10.0, 20.0, 90.0, 0.0]]))[0, 3]
+    assert np.array_equal(workspace.nearest(inside), inside)
+
+    outside = np.array([2000.0, 0.0, 0.0])
+    projected = workspace.nearest(outside)
+    assert workspace.contains(projected)
+    _angles, valid = world.inverse_batch(projected, LIMITS)
+    assert valid[0]
+    assert np.linalg.norm(projected) < np.linalg.norm(outside)
+
+def test_cache_key():
+    other = LIMITS.copy()
+    other[1] = (-30.0, 30.0)
+    first = Workspace.__new__(Workspace)
+    first.limits, first.resolution = LIMITS, 40.0
+    second = Workspace.__new__(Workspace)
+    second.limits, second.resolution = other, 40.0
+    assert first.key() != second.key()
+    second.limits = LIMITS.copy()
+    assert first.key() == second.key()
+
+def test_reload_from_cache(tmp_path, monkeypatch):
+    built = Workspace(LIMITS, resolution=40.0, cache=str(tmp_path))
+    assert len(list(tmp_path.iterdir())) == 1
+
+    def no_build(self):
+        raise AssertionError("rebuilt instead of loaded")
+    monkeypatch.setattr(Workspace, "build", no_build)
+    loaded = Workspace(LIMITS, resolution=40.0, cache=str(tmp_path))
+    assert np.array_equal(loaded.reachable, built.reachable)
+    assert np.array_equal(loaded.nearest_index, built.nearest_index)
@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("pydantic")
+
+from app import world
+
+def test_round_trip():
+    rng = np.random.default_rng(0)
+    angles = np.zeros((200, 4))
+    angles[:, 0] = rng.uniform(-170, 170, 200)
+    angles[:, 1] = rng.uniform(-80, 80, 200)
+    angles[:, 2] = rng.uniform(10, 150, 200)
+    positions = world.direct_batch(angles)[:, 3]
+
+    solved, valid = world.inverse_batch(positions)
+    assert valid.all()
+    assert np.allclose(world.direct_batch(solved)[:, 3], positions)
+
+def test_out_of_reach_is_invalid():
+    # Past the elbow pivot, along the arm plane
+    reach = world.bras_horizontal + 2 * world.bras
+    positions = np.array([[reach - 10, 0, 0], [reach + 60, 0, 0], [reach + 160, 0, 0]])
+    _angles, valid = world.inverse_batch(positions)
+    assert valid.tolist() == [True, False, False]
+
+def test_limits_use_the_other_elbow():
+    position = world.direct_batch(np.array([[0, 20, 90, 0]]))[:, 3]
+    down, valid = world.inverse_batch(position)
+    assert valid[0] and down[0, 2] < 0
+    # Forbid the elbow down bras2 angle (negative): elbow up
+    limits = np.tile([-180.0, 180.0], (4, 1))
+    limits[2] = (0, 180)
+    angles, valid = world.inverse_batch(position, limits)
+    assert valid[0]
+    assert np.allclose(world.direct_batch(angles)[:, 3], position)
+    assert np.allclose(angles[0], [0, 20, 90, 0])
+
+def test_limits_reject_when_both_elbows_are_outside():
+    position = world.direct_batch(np.array([[0, 20, 90, 0]]))[:, 3]
+    # Bent arm: both elbows bend bras2 by 90°, outside ]-1, 1[
+    limits = np.tile([-180.0, 180.0], (4, 1))
+    limits[2] = (-1, 1)
+    _angles, valid = world.inverse_batch(position, limits)
+    assert not valid[0]